@@ -2,26 +2,36 @@
 
 import sys
 import os
+import hashlib
+import time
 
 # Modern MCP approach using FastMCP
 from mcp.server.fastmcp import FastMCP
 
 from services.document_mongodb_service import DocumentMongoDBService
-from services.alternative_embedding_service import AlternativeEmbeddingService as EmbeddingService
+from services.alternative_embedding_service import AlternativeEmbeddingService as EmbeddingService, EMBED_CONCURRENCY
 from services.document_processing_service import DocumentProcessingService
-from database.connection import connect_db
+from services.semantic_cache_service import SemanticQueryCache
+# Same connection preference as the service layer's get_database lookup
+try:
+    from database.cloud_connection import connect_db_cloud_safe as connect_db
+except ImportError:
+    from database.connection import connect_db
 from database.models.document_chunk_model import DocumentChunk
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator, Tuple
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 import asyncio
 import concurrent.futures
+import queue
+import threading
 
 # --- Global service instances (lazy-loaded) ---
 embedding_service_instance = None
 document_mongodb_service_instance = None
 document_processing_service_instance = None
+llm_instance = None
 
 def get_services():
     """Lazy-load services to avoid environment variable issues at import time"""
@@ -37,6 +47,42 @@ def get_services():
     
     return embedding_service_instance, document_mongodb_service_instance, document_processing_service_instance
 
+def get_llm() -> ChatGoogleGenerativeAI:
+    """Lazy-load the chat model used to generate answers from retrieved context"""
+    global llm_instance
+    
+    if llm_instance is None:
+        get_services()  # Ensures environment variables are loaded
+        llm_instance = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
+    
+    return llm_instance
+
+# Prompt used to answer questions from retrieved document context (parsed once at import)
+RAG_PROMPT = PromptTemplate(
+    input_variables=["context", "question"],
+    template="""Based on the following document context, please answer the question.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+)
+
+# Maximum characters of retrieved text sent to the LLM (~1500 tokens)
+CONTEXT_CHAR_BUDGET = 6000
+
+NO_RESULTS_ANSWER = "I could not find any relevant information in the documents for your query."
+
+# Ingestion pipeline: chunks queued between the document parser and the embedding workers,
+# and the most chunks a worker sends per embedding request (the API's batch limit)
+EMBED_QUEUE_SIZE = 256
+EMBED_PIPELINE_BATCH_SIZE = 100
+
+# --- Semantic cache for search results (paraphrased repeat queries skip search + LLM) ---
+semantic_query_cache = SemanticQueryCache(threshold=0.95, ttl_seconds=300.0)
+
 # --- Create FastMCP Server ---
 app = FastMCP("Document Analysis MCP Server")
 
@@ -61,6 +107,9 @@ class RetrievedDocumentChunk(BaseModel):
     section_title: Optional[str] = None
     score: float
 
+# Validates/serializes whole lists of chunks in a single pass
+_CHUNKS_ADAPTER = TypeAdapter(List[RetrievedDocumentChunk])
+
 class DocumentSearchResult(BaseModel):
     answer: str = Field(..., description="The AI-generated answer based on the retrieved document context")
     retrieved_chunks: List[RetrievedDocumentChunk] = Field(..., description="List of document chunks used to generate the answer")
@@ -73,6 +122,86 @@ class DocumentInfo(BaseModel):
     chunk_count: int
     last_updated: str
 
+async def _embed_chunk_batch(chunks: List[Dict[str, Any]], embedding_service, mongodb_service) -> int:
+    """Embeds a batch of chunks in place, reusing cached vectors; returns how many were reused."""
+    texts_by_hash = {}
+    chunk_hashes = []
+    for chunk in chunks:
+        content_hash = hashlib.blake2b(chunk['text_content'].encode(), digest_size=16).hexdigest()
+        texts_by_hash.setdefault(content_hash, chunk['text_content'])
+        chunk_hashes.append(content_hash)
+    
+    embeddings_by_hash = await mongodb_service.get_cached_embeddings(
+        list(texts_by_hash), embedding_service.cache_namespace
+    )
+    missing_hashes = [h for h in texts_by_hash if h not in embeddings_by_hash]
+    
+    # Only cache misses are sent to the embedding API
+    if missing_hashes:
+        # One float32 row per text; rows stay numpy arrays until they are packed for storage
+        embeddings = await embedding_service.get_embeddings_matrix([texts_by_hash[h] for h in missing_hashes])
+        new_embeddings = dict(zip(missing_hashes, embeddings))
+        await mongodb_service.cache_embeddings(new_embeddings, embedding_service.cache_namespace)
+        embeddings_by_hash.update(new_embeddings)
+    
+    for chunk, content_hash in zip(chunks, chunk_hashes):
+        chunk['embedding'] = embeddings_by_hash[content_hash]
+        chunk['content_hash'] = content_hash
+    return len(chunks) - len(missing_hashes)
+
+async def _embed_chunk_stream(chunk_stream: AsyncIterator[Dict[str, Any]], embedding_service, mongodb_service) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Embeds chunks while the document is still being parsed.
+    
+    The parser feeds a bounded queue; EMBED_CONCURRENCY workers drain it in batches of up to
+    EMBED_PIPELINE_BATCH_SIZE, so PDF/text parsing overlaps the embedding requests.
+    Returns the chunks in document order and how many embeddings came from the cache.
+    """
+    chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=EMBED_QUEUE_SIZE)
+    chunks = []
+    reused = 0
+    
+    async def produce():
+        try:
+            async for chunk in chunk_stream:
+                chunks.append(chunk)
+                await chunk_queue.put(chunk)
+        finally:
+            # Close the parser (and its open file) now rather than whenever it is collected
+            aclose = getattr(chunk_stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        
+        # One end marker per worker; on failure the workers are cancelled instead
+        for _ in range(EMBED_CONCURRENCY):
+            await chunk_queue.put(None)
+    
+    async def consume():
+        nonlocal reused
+        done = False
+        while not done:
+            batch = []
+            item = await chunk_queue.get()
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= EMBED_PIPELINE_BATCH_SIZE or chunk_queue.empty():
+                    break
+                item = chunk_queue.get_nowait()
+            done = item is None
+            if batch:
+                reused += await _embed_chunk_batch(batch, embedding_service, mongodb_service)
+    
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(EMBED_CONCURRENCY)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Wait for the cancellations so no task outlives the upload
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return chunks, reused
+
 # --- MCP Tool Implementations ---
 
 @app.tool()
@@ -94,27 +223,32 @@ async def upload_and_process_document(file_path: str, chunk_size: int = 1000, ov
         # Get lazy-loaded services
         embedding_service, mongodb_service, processing_service = get_services()
         
-        # Process the document
-        document_id, document_name, chunks = await processing_service.process_document(
-            file_path, chunk_size, overlap
-        )
+        # Parse, chunk and embed as a pipeline, reusing cached vectors for previously seen chunk content
+        print("Processing and embedding chunks...")
+        embed_start = time.perf_counter()
+        try:
+            chunks, reused = await _embed_chunk_stream(
+                processing_service.stream_document(file_path, chunk_size, overlap),
+                embedding_service, mongodb_service
+            )
+            print(
+                f"Embedded {len(chunks)} chunks in {time.perf_counter() - embed_start:.2f}s "
+                f"({reused} reused from cache)"
+            )
+        except Exception as embed_error:
+            print(f"Error processing or embedding document: {embed_error}")
+            raise
         
+        document_id = chunks[0]['document_id']
+        document_name = chunks[0]['document_name']
         print(f"Document processed: {document_name} ({len(chunks)} chunks)")
         
-        # Generate embeddings and store chunks
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i+1}/{len(chunks)}")
-            try:
-                chunk['embedding'] = await embedding_service.get_embedding(chunk['text_content'])
-                print(f"Successfully generated embedding for chunk {i+1}")
-            except Exception as embed_error:
-                print(f"Error generating embedding for chunk {i+1}: {embed_error}")
-                raise
-        
         # Store chunks in database
         try:
-            await mongodb_service.insert_document_chunks_batch(chunks)
+            await mongodb_service.bulk_insert_raw(chunks)
             print(f"Successfully stored {len(chunks)} chunks in database")
+            # Cached answers may no longer reflect the stored documents
+            semantic_query_cache.clear()
         except Exception as db_error:
             print(f"Error storing chunks in database: {db_error}")
             raise
@@ -137,6 +271,83 @@ async def upload_and_process_document(file_path: str, chunk_size: int = 1000, ov
             "chunks_created": 0
         }
 
+async def _retrieve_search_context(query_text: str, document_id: Optional[str], limit: int) -> Dict[str, Any]:
+    """
+    Retrieval step shared by search_documents and stream_search_documents.
+    
+    Returns a dictionary with the query embedding and cache scope, plus either a
+    cached result for a similar query or the retrieved chunks and the LLM prompt.
+    """
+    # Get lazy-loaded services
+    embedding_service, mongodb_service, processing_service = get_services()
+    
+    # Embed the query once; the vector drives both the cache lookup and the vector search.
+    # The API call is started first so it overlaps with the remaining setup.
+    embedding_task = asyncio.create_task(embedding_service.get_embedding(query_text))
+    
+    print(f"Searching documents with query: '{query_text}'")
+    if document_id:
+        print(f"Filtering by document_id: {document_id}")
+    
+    search_context = {
+        "query_embedding": None,
+        "cache_scope": (document_id, limit),
+        "cached_result": None,
+        "retrieved_chunks": [],
+        "source_documents": [],
+        "prompt": None,
+        "llm": None
+    }
+    
+    query_embedding = await embedding_task
+    search_context["query_embedding"] = query_embedding
+    
+    cached_result = semantic_query_cache.get(query_embedding, scope=search_context["cache_scope"])
+    if cached_result is not None:
+        print("Returning cached result for a semantically similar query")
+        search_context["cached_result"] = cached_result
+        return search_context
+    
+    # Perform semantic search; on first use the LLM client is constructed in a worker thread meanwhile
+    search_task = asyncio.create_task(mongodb_service.find_chunks_by_semantic_search(
+        query_text=query_text,
+        document_id=document_id,
+        limit=limit,
+        query_embedding=query_embedding
+    ))
+    try:
+        search_context["llm"] = llm_instance or await asyncio.to_thread(get_llm)
+    except Exception as e:
+        # Retried (and reported) when the answer is generated
+        print(f"Error creating LLM client: {e}")
+    retrieved_docs_raw = await search_task
+    
+    if not retrieved_docs_raw:
+        print("No relevant chunks found.")
+        return search_context
+    
+    retrieved_chunks_models = _CHUNKS_ADAPTER.validate_python(retrieved_docs_raw)
+    
+    # Get unique source documents, keeping relevance order (highest-ranked first)
+    source_documents = list(dict.fromkeys(chunk.document_name for chunk in retrieved_chunks_models))
+    
+    # Create context for LLM in one pass, in relevance order, capped at the character budget
+    context_parts = []
+    context_length = 0
+    for doc in retrieved_docs_raw:
+        text = doc['text_content']
+        if context_parts and context_length + len(text) > CONTEXT_CHAR_BUDGET:
+            break
+        context_parts.append(text)
+        context_length += len(text)
+    context = "\n\n".join(context_parts)
+    print(f"Context provided to LLM: {len(context_parts)} chunks, {len(context)} characters")
+    
+    search_context["retrieved_chunks"] = retrieved_chunks_models
+    search_context["source_documents"] = source_documents
+    search_context["prompt"] = RAG_PROMPT.format(context=context, question=query_text)
+    return search_context
+
 @app.tool()
 async def search_documents(query_text: str, document_id: Optional[str] = None, limit: int = 5) -> dict:
     """
@@ -150,79 +361,92 @@ async def search_documents(query_text: str, document_id: Optional[str] = None, l
     Returns:
         Dictionary with answer and retrieved chunks
     """
-    print(f"Searching documents with query: '{query_text}'")
-    if document_id:
-        print(f"Filtering by document_id: {document_id}")
+    search_context = await _retrieve_search_context(query_text, document_id, limit)
     
-    # Get lazy-loaded services
-    embedding_service, mongodb_service, processing_service = get_services()
+    if search_context["cached_result"] is not None:
+        return search_context["cached_result"]
     
-    # Perform semantic search
-    retrieved_docs_raw = await mongodb_service.find_chunks_by_semantic_search(
-        query_text=query_text,
-        document_id=document_id,
-        limit=limit
-    )
-    
-    if not retrieved_docs_raw:
-        print("No relevant chunks found.")
+    if not search_context["retrieved_chunks"]:
         return {
-            "answer": "I could not find any relevant information in the documents for your query.",
+            "answer": NO_RESULTS_ANSWER,
             "retrieved_chunks": [],
             "source_documents": []
         }
     
-    retrieved_chunks_models = [RetrievedDocumentChunk(**doc) for doc in retrieved_docs_raw]
-    
-    # Get unique source documents
-    source_documents = list(set([chunk.document_name for chunk in retrieved_chunks_models]))
-    
-    # Create context for LLM
-    context_string = "\n---\n".join([
-        f"Document: {chunk.document_name}\nChunk {chunk.chunk_index}: {chunk.text_content}"
-        for chunk in retrieved_chunks_models
-    ])
-    print(f"Context provided to LLM:\n{context_string[:500]}..." if len(context_string) > 500 else context_string)
+    # Serialized once (python mode, no embedding field) for both the answer and error paths
+    retrieved_chunks = _CHUNKS_ADAPTER.dump_python(search_context["retrieved_chunks"])
+    source_documents = search_context["source_documents"]
     
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=os.getenv("GOOGLE_API_KEY"))
-        
-        # Create context from documents
-        context = "\n\n".join([doc['text_content'] for doc in retrieved_docs_raw])
-        
-        # Create prompt template
-        prompt_template = PromptTemplate(
-            input_variables=["context", "question"],
-            template="""Based on the following document context, please answer the question.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        )
-        
-        # Create the prompt and invoke
-        prompt = prompt_template.format(context=context, question=query_text)
-        response = await llm.ainvoke(prompt)
+        llm = search_context["llm"] or get_llm()
+        response = await llm.ainvoke(search_context["prompt"])
         generated_answer = response.content if hasattr(response, 'content') else str(response)
         
         print(f"Generated answer: {generated_answer}")
         
-        return {
+        result = {
             "answer": generated_answer,
-            "retrieved_chunks": [chunk.model_dump() for chunk in retrieved_chunks_models],
+            "retrieved_chunks": retrieved_chunks,
             "source_documents": source_documents
         }
+        semantic_query_cache.put(search_context["query_embedding"], result, scope=search_context["cache_scope"])
+        
+        return result
         
     except Exception as e:
         print(f"Error during LLM generation: {e}")
         return {
             "answer": f"An error occurred while generating the answer: {str(e)}",
-            "retrieved_chunks": [chunk.model_dump() for chunk in retrieved_chunks_models],
+            "retrieved_chunks": retrieved_chunks,
+            "source_documents": source_documents
+        }
+
+async def stream_search_documents(query_text: str, document_id: Optional[str] = None, limit: int = 5) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of search_documents.
+    
+    Yields a "context" event with the retrieved chunks and source documents first,
+    followed by "token" events carrying the answer text as the LLM generates it.
+    """
+    search_context = await _retrieve_search_context(query_text, document_id, limit)
+    
+    cached_result = search_context["cached_result"]
+    if cached_result is not None:
+        yield {
+            "type": "context",
+            "retrieved_chunks": cached_result["retrieved_chunks"],
+            "source_documents": cached_result["source_documents"]
+        }
+        yield {"type": "token", "content": cached_result["answer"]}
+        return
+    
+    retrieved_chunks = _CHUNKS_ADAPTER.dump_python(search_context["retrieved_chunks"])
+    source_documents = search_context["source_documents"]
+    yield {"type": "context", "retrieved_chunks": retrieved_chunks, "source_documents": source_documents}
+    
+    if not retrieved_chunks:
+        yield {"type": "token", "content": NO_RESULTS_ANSWER}
+        return
+    
+    try:
+        llm = search_context["llm"] or get_llm()
+        answer_parts = []
+        async for chunk in llm.astream(search_context["prompt"]):
+            text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+            if text:
+                answer_parts.append(text)
+                yield {"type": "token", "content": text}
+        
+        result = {
+            "answer": "".join(answer_parts),
+            "retrieved_chunks": retrieved_chunks,
             "source_documents": source_documents
         }
+        semantic_query_cache.put(search_context["query_embedding"], result, scope=search_context["cache_scope"])
+        
+    except Exception as e:
+        print(f"Error during LLM generation: {e}")
+        yield {"type": "token", "content": f"An error occurred while generating the answer: {str(e)}"}
 
 @app.tool()
 async def list_documents() -> dict:
@@ -238,22 +462,13 @@ async def list_documents() -> dict:
         # Get lazy-loaded services
         embedding_service, mongodb_service, processing_service = get_services()
         
+        # Documents come back fully shaped, with last_updated as an ISO date string
         documents = await mongodb_service.get_documents_list()
         
-        document_list = []
-        for doc in documents:
-            document_list.append({
-                "document_id": doc["document_id"],
-                "document_name": doc["document_name"],
-                "document_type": doc["document_type"],
-                "chunk_count": doc["chunk_count"],
-                "last_updated": doc["last_updated"].isoformat() if doc["last_updated"] else None
-            })
-        
         return {
             "success": True,
-            "documents": document_list,
-            "total_documents": len(document_list)
+            "documents": documents,
+            "total_documents": len(documents)
         }
         
     except Exception as e:
@@ -285,6 +500,7 @@ async def delete_document(document_id: str) -> dict:
         deleted_count = await mongodb_service.delete_document(document_id)
         
         if deleted_count > 0:
+            semantic_query_cache.clear()
             return {
                 "success": True,
                 "message": f"Successfully deleted document with {deleted_count} chunks",
@@ -305,26 +521,59 @@ async def delete_document(document_id: str) -> dict:
             "deleted_chunks": 0
         }
 
+# --- Background Event Loop for Synchronous Callers ---
+# One long-lived loop (and one MongoDB client) is shared by every sync wrapper call,
+# instead of creating a thread, an event loop and a new connection per request.
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+_database_ready = False
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Start the shared background event loop on first use and connect to the database on it."""
+    global _background_loop, _database_ready
+    
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="document-tools-loop", daemon=True).start()
+            _background_loop = loop
+        
+        if not _database_ready:
+            asyncio.run_coroutine_threadsafe(
+                connect_db(document_models=[DocumentChunk]), _background_loop
+            ).result(timeout=60)
+            _database_ready = True
+    
+    return _background_loop
+
+def run_async_nowait(coro) -> concurrent.futures.Future:
+    """Schedule a coroutine on the shared background loop without waiting for its result."""
+    try:
+        loop = get_background_loop()
+    except Exception:
+        coro.close()
+        raise
+    
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+def run_async(coro, timeout: Optional[float] = None):
+    """Run a coroutine on the shared background loop and block until it completes."""
+    future = run_async_nowait(coro)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
 # --- Synchronous Wrappers for Streamlit ---
 
 def upload_and_process_document_sync(file_path: str, chunk_size: int = 1000, overlap: int = 200) -> dict:
     """Synchronous wrapper for document upload"""
     try:
-        def run_in_new_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                new_loop.run_until_complete(connect_db(document_models=[DocumentChunk]))
-                return new_loop.run_until_complete(
-                    upload_and_process_document(file_path=file_path, chunk_size=chunk_size, overlap=overlap)
-                )
-            finally:
-                new_loop.close()
-        
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(run_in_new_thread)
-            result = future.result(timeout=300)  # 5 minute timeout for document processing
-            return result
+        return run_async(
+            upload_and_process_document(file_path=file_path, chunk_size=chunk_size, overlap=overlap),
+            timeout=300  # 5 minute timeout for document processing
+        )
                 
     except Exception as e:
         print(f"Error in upload sync wrapper: {e}")
@@ -339,28 +588,18 @@ def upload_and_process_document_sync(file_path: str, chunk_size: int = 1000, ove
 def search_documents_sync(query_text: str, document_id: Optional[str] = None, limit: int = 5) -> DocumentSearchResult:
     """Synchronous wrapper for document search"""
     try:
-        def run_in_new_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                new_loop.run_until_complete(connect_db(document_models=[DocumentChunk]))
-                return new_loop.run_until_complete(
-                    search_documents(query_text=query_text, document_id=document_id, limit=limit)
-                )
-            finally:
-                new_loop.close()
+        result = run_async(
+            search_documents(query_text=query_text, document_id=document_id, limit=limit),
+            timeout=60  # 60 second timeout
+        )
         
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(run_in_new_thread)
-            result = future.result(timeout=60)  # 60 second timeout
-            
-            # Convert dict result to DocumentSearchResult
-            retrieved_chunks = [RetrievedDocumentChunk(**chunk) for chunk in result.get("retrieved_chunks", [])]
-            return DocumentSearchResult(
-                answer=result.get("answer", ""),
-                retrieved_chunks=retrieved_chunks,
-                source_documents=result.get("source_documents", [])
-            )
+        # Convert dict result to DocumentSearchResult
+        retrieved_chunks = _CHUNKS_ADAPTER.validate_python(result.get("retrieved_chunks", []))
+        return DocumentSearchResult(
+            answer=result.get("answer", ""),
+            retrieved_chunks=retrieved_chunks,
+            source_documents=result.get("source_documents", [])
+        )
                 
     except Exception as e:
         print(f"Error in search sync wrapper: {e}")
@@ -370,21 +609,53 @@ def search_documents_sync(query_text: str, document_id: Optional[str] = None, li
             source_documents=[]
         )
 
+def search_documents_stream_sync(query_text: str, document_id: Optional[str] = None, limit: int = 5) -> Iterator[Dict[str, Any]]:
+    """
+    Synchronous generator over stream_search_documents events.
+    Events are forwarded from the background loop through a queue as soon as they arrive.
+    """
+    events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+    
+    async def forward_events():
+        context_sent = False
+        try:
+            async for event in stream_search_documents(query_text=query_text, document_id=document_id, limit=limit):
+                context_sent = context_sent or event["type"] == "context"
+                events.put(event)
+        except Exception as e:
+            print(f"Error in search stream wrapper: {e}")
+            if not context_sent:
+                events.put({"type": "context", "retrieved_chunks": [], "source_documents": []})
+            events.put({"type": "token", "content": f"An error occurred while searching: {str(e)}"})
+        finally:
+            events.put(None)  # End of stream
+    
+    future = run_async_nowait(forward_events())
+    context_sent = False
+    
+    try:
+        while True:
+            try:
+                event = events.get(timeout=60)  # 60 second timeout between events
+            except queue.Empty:
+                print("Error in search stream wrapper: timed out waiting for the next event")
+                future.cancel()
+                if not context_sent:
+                    yield {"type": "context", "retrieved_chunks": [], "source_documents": []}
+                yield {"type": "token", "content": "An error occurred while searching: the search timed out."}
+                break
+            if event is None:
+                break
+            context_sent = context_sent or event["type"] == "context"
+            yield event
+    finally:
+        # Stop the producer if the consumer stops early or the stream timed out
+        future.cancel()
+
 def list_documents_sync() -> dict:
     """Synchronous wrapper for listing documents"""
     try:
-        def run_in_new_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
-            try:
-                new_loop.run_until_complete(connect_db(document_models=[DocumentChunk]))
-                return new_loop.run_until_complete(list_documents())
-            finally:
-                new_loop.close()
-        
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(run_in_new_thread)
-            return future.result(timeout=30)
+        return run_async(list_documents(), timeout=30)
                 
     except Exception as e:
         print(f"Error in list sync wrapper: {e}")
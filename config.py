@@ -0,0 +1,32 @@
+"""
+Environment settings for the setup, startup and diagnostic scripts, read once per process.
+"""
+
+import functools
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    mongo_uri: Optional[str]
+    google_api_key: Optional[str]
+    database_name: str
+    collection_name: str
+    vector_index_name: str
+    is_render: bool
+
+@functools.lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Snapshot of the environment, taken on first call.
+    Call it after load_dotenv() and after any environment setup, since later changes are not seen.
+    """
+    return Settings(
+        mongo_uri=os.getenv("MONGODB_CONNECTION_STRING"),
+        google_api_key=os.getenv("GOOGLE_API_KEY"),
+        database_name=os.getenv("DATABASE_NAME", "document_analysis"),
+        collection_name=os.getenv("COLLECTION_NAME", "document_chunks"),
+        vector_index_name=os.getenv("VECTOR_INDEX_NAME", "vector_index"),
+        is_render=bool(os.getenv("RENDER") or os.getenv("RENDER_SERVICE_NAME")),
+    )
@@ -0,0 +1,85 @@
+"""
+Process-wide Motor client shared by both connection modules and the setup/diagnostic scripts.
+Whichever entry point connects first registers its client here, so a process pays for one
+TLS handshake and one connection pool per event loop (Motor clients cannot be used across loops).
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# The shared client of each event loop (None when created outside a running loop);
+# entries for closed loops are closed and dropped on the next access
+_clients: "Dict[Optional[asyncio.AbstractEventLoop], AsyncIOMotorClient]" = {}
+
+# Guards the handoff of the shared client between threads (each running its own loop)
+_state_lock = threading.RLock()
+
+# Serializes connect attempts per event loop; an asyncio lock cannot be shared across loops
+_connect_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+def _current_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+def get_connect_lock() -> asyncio.Lock:
+    """The connect lock for the running event loop, shared by both connection modules."""
+    loop = asyncio.get_running_loop()
+    with _state_lock:
+        lock = _connect_locks.get(loop)
+        if lock is None:
+            lock = _connect_locks[loop] = asyncio.Lock()
+        return lock
+
+def _discard_closed_loops():
+    """Closes the clients left behind by event loops that have finished."""
+    for loop in [loop for loop in _clients if loop is not None and loop.is_closed()]:
+        _clients.pop(loop).close()
+
+def get_shared_client():
+    """
+    Returns the client registered for the running event loop, or None if there is none.
+    Clients of other live loops are left untouched; their own loop closes them.
+    """
+    with _state_lock:
+        _discard_closed_loops()
+        return _clients.get(_current_loop())
+
+def set_shared_client(client: AsyncIOMotorClient):
+    """Registers a connected client as the shared client of the running event loop."""
+    with _state_lock:
+        _discard_closed_loops()
+        previous = _clients.get(_current_loop())
+        if previous is not None and previous is not client:
+            previous.close()
+        _clients[_current_loop()] = client
+
+def close_shared_client():
+    """Closes and forgets the running event loop's shared client."""
+    with _state_lock:
+        client = _clients.pop(_current_loop(), None)
+        if client is not None:
+            client.close()
+
+def get_motor_client() -> AsyncIOMotorClient:
+    """
+    Returns the shared client, creating it with the standard connection options if needed.
+    Creating the client does not block; the driver connects in the background.
+    """
+    with _state_lock:
+        client = get_shared_client()
+        if client is None:
+            from database.connection import build_client_options
+
+            mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
+            if not mongo_uri:
+                raise ValueError("MONGODB_CONNECTION_STRING environment variable not set.")
+
+            client = AsyncIOMotorClient(mongo_uri, **build_client_options(mongo_uri))
+            set_shared_client(client)
+        return client
@@ -7,92 +7,213 @@ import asyncio
 import os
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Type
+from typing import List, Set, Type
 from beanie import Document
+from database.connection import get_pool_options
+from database.client_singleton import close_shared_client, get_connect_lock, get_shared_client, set_shared_client
 import ssl
 import urllib.parse
 
+# Resolve the CA bundle path once instead of on every connection attempt
+try:
+    import certifi
+    _CA = certifi.where()
+except ImportError:
+    _CA = None
+
 # Global variables to store the client and database
 _client: AsyncIOMotorClient = None
 _database = None
+# Models registered by a completed init_beanie, so later calls skip the model setup entirely
+_initialized_models: Set[Type[Document]] = set()
+# Name of the strategy that last connected, tried first on reconnect
+_SUCCESSFUL_STRATEGY = None
+
+def _is_connected() -> bool:
+    """True while our client is still the live shared client; resets state once it is not."""
+    global _client, _database
+    if _client is not None and _client is not get_shared_client():
+        # Closed by another module, or registered by a different event loop
+        _client = None
+        _database = None
+        _initialized_models.clear()
+    return _client is not None
 
 async def connect_db_cloud_safe(document_models: List[Type[Document]]):
     """
     Cloud-safe MongoDB connection with multiple fallback strategies.
     Specifically designed for Streamlit Cloud deployment.
     """
-    global _client, _database
-    
-    mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
-    if not mongo_uri:
-        raise ValueError("MONGODB_CONNECTION_STRING environment variable not set.")
+    global _client, _database, _SUCCESSFUL_STRATEGY
     
-    mongo_db = os.getenv("DATABASE_NAME", "document_analysis")
-    environment = os.getenv("ENVIRONMENT", "development")
+    # Fast path: the client is already connected and these models are initialized
+    if _is_connected() and _initialized_models.issuperset(document_models):
+        return True
     
-    print(f"🔧 Attempting cloud-safe MongoDB connection...")
-    print(f"Environment: {environment}")
+    async with get_connect_lock():
+        # Another caller may have connected while we waited for the lock
+        if _is_connected() and _initialized_models.issuperset(document_models):
+            return True
+        
+        # Already connected: reuse the client and only register the new models
+        if _is_connected():
+            models = list(_initialized_models.union(document_models))
+            await init_beanie(database=_database, document_models=models)
+            _initialized_models.update(models)
+            return True
+        
+        mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
+        if not mongo_uri:
+            raise ValueError("MONGODB_CONNECTION_STRING environment variable not set.")
+        
+        mongo_db = os.getenv("DATABASE_NAME", "document_analysis")
+        environment = os.getenv("ENVIRONMENT", "development")
+        
+        print(f"🔧 Attempting cloud-safe MongoDB connection...")
+        print(f"Environment: {environment}")
+        
+        # Strategies that validate the server certificate, and ones that do not (last resort)
+        secure_strategies = [
+            ("Render Optimized", get_render_optimized_options),
+            ("Standard SSL", get_standard_ssl_options),
+            ("Relaxed SSL", get_relaxed_ssl_options),
+            ("Minimal SSL", get_minimal_ssl_options),
+        ]
+        insecure_strategies = [
+            ("Streamlit Cloud Special", get_streamlit_cloud_options),
+            ("Basic Connection", get_basic_options)
+        ]
+        
+        # Appropriate timeout for Render cold starts
+        timeout = 45.0 if os.getenv("RENDER") or os.getenv("RENDER_SERVICE_NAME") else 15.0
+        
+        # Another entry point already connected this process: reuse its client, no race needed
+        client = get_shared_client()
+        winner = "Shared client" if client is not None else None
+        last_error = None
+        
+        # Reconnects try the secure strategy that worked last time on its own first,
+        # so only a failure there opens the full set of racing clients
+        if client is None:
+            previous = [s for s in secure_strategies if s[0] == _SUCCESSFUL_STRATEGY]
+            winner, client, last_error = await _try_in_turn(previous, mongo_uri, timeout)
+        
+        # Race the certificate-validating strategies instead of waiting out each one's timeout in turn
+        if client is None:
+            winner, client, last_error = await _race_strategies(secure_strategies, mongo_uri, timeout)
+        
+        # Only when every validating strategy failed, fall back to the insecure ones, one at a time
+        if client is None:
+            print("⚠️  Secure strategies failed; trying connections without certificate validation...")
+            winner, client, insecure_error = await _try_in_turn(insecure_strategies, mongo_uri, timeout)
+            last_error = insecure_error or last_error
+        
+        if client is not None:
+            try:
+                _client = client
+                _database = _client[mongo_db]
+                set_shared_client(_client)
+                
+                # Initialize Beanie
+                await init_beanie(database=_database, document_models=document_models)
+                _initialized_models.update(document_models)
+                
+                if winner != "Shared client":
+                    _SUCCESSFUL_STRATEGY = winner
+                print(f"✅ Successfully connected using {winner}")
+                print(f"✅ Database: {mongo_db}")
+                print(f"✅ Models initialized: {len(document_models)}")
+                
+                return True
+                
+            except Exception as e:
+                print(f"❌ {winner}: {str(e)[:100]}...")
+                last_error = f"{winner}: {str(e)}"
+                
+                # Clean up failed connection
+                close_shared_client()
+                _client = None
+                _database = None
+        
+        # All strategies failed
+        print(f"\n❌ All connection strategies failed!")
+        print(f"Last error: {last_error}")
+        print("\n🔧 Troubleshooting suggestions:")
+        print("1. Check MongoDB Atlas cluster is running")
+        print("2. Verify network access allows 0.0.0.0/0")
+        print("3. Check connection string format")
+        print("4. Try restarting the Streamlit app")
+        
+        raise Exception(f"Could not connect to MongoDB Atlas. Last error: {last_error}")
+
+def _strategy_error(strategy_name: str, error: BaseException) -> str:
+    """Prints and returns the failure message for one strategy."""
+    if isinstance(error, asyncio.TimeoutError):
+        print(f"❌ {strategy_name}: Connection timeout")
+        return f"{strategy_name}: Connection timeout"
+    print(f"❌ {strategy_name}: {str(error)[:100]}...")
+    return f"{strategy_name}: {str(error)}"
+
+async def _race_strategies(strategies, mongo_uri: str, timeout: float):
+    """Runs the strategies concurrently; returns (name, client, last_error) of the first to connect."""
+    print(f"🔄 Trying {len(strategies)} connection strategies in parallel...")
+    preference = [strategy_name for strategy_name, _ in strategies]
+    tasks = {
+        asyncio.create_task(_try_strategy(option_func, mongo_uri, timeout)): strategy_name
+        for strategy_name, option_func in strategies
+    }
+    pending = set(tasks)
+    winner = None
+    client = None
+    last_error = None
     
-    # Multiple connection strategies to try (ordered from most to least secure)
-    connection_strategies = [
-        ("Render Optimized", get_render_optimized_options),
-        ("Standard SSL", get_standard_ssl_options),
-        ("Relaxed SSL", get_relaxed_ssl_options),
-        ("Streamlit Cloud Special", get_streamlit_cloud_options),
-        ("Minimal SSL", get_minimal_ssl_options),
-        ("Basic Connection", get_basic_options)
-    ]
+    try:
+        while pending and client is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # On ties, prefer the more secure strategy
+            for task in sorted(done, key=lambda t: preference.index(tasks[t])):
+                strategy_name = tasks[task]
+                try:
+                    candidate = task.result()
+                except Exception as e:
+                    last_error = _strategy_error(strategy_name, e)
+                    continue
+                
+                if client is None:
+                    winner, client = strategy_name, candidate
+                else:
+                    candidate.close()
+    finally:
+        # Cancel the losers and close any client that connected while being cancelled
+        for task in pending:
+            task.cancel()
+        for result in await asyncio.gather(*pending, return_exceptions=True):
+            if isinstance(result, AsyncIOMotorClient):
+                result.close()
     
+    return winner, client, last_error
+
+async def _try_in_turn(strategies, mongo_uri: str, timeout: float):
+    """Tries the strategies one after another; returns (name, client, last_error) of the first to connect."""
     last_error = None
-    
-    for strategy_name, option_func in connection_strategies:
-        print(f"🔄 Trying {strategy_name} connection...")
-        
+    for strategy_name, option_func in strategies:
+        print(f"🔄 Trying {strategy_name}...")
         try:
-            client_options = option_func()
-            _client = AsyncIOMotorClient(mongo_uri, **client_options)
-            _database = _client[mongo_db]
-            
-            # Test the connection with appropriate timeout for Render
-            timeout = 45.0 if os.getenv("RENDER") or os.getenv("RENDER_SERVICE_NAME") else 15.0
-            await asyncio.wait_for(_client.admin.command('hello'), timeout=timeout)
-            
-            # Initialize Beanie
-            await init_beanie(database=_database, document_models=document_models)
-            
-            print(f"✅ Successfully connected using {strategy_name}")
-            print(f"✅ Database: {mongo_db}")
-            print(f"✅ Models initialized: {len(document_models)}")
-            
-            return True
-            
-        except asyncio.TimeoutError:
-            print(f"❌ {strategy_name}: Connection timeout")
-            last_error = f"{strategy_name}: Connection timeout"
-            
+            return strategy_name, await _try_strategy(option_func, mongo_uri, timeout), last_error
         except Exception as e:
-            print(f"❌ {strategy_name}: {str(e)[:100]}...")
-            last_error = f"{strategy_name}: {str(e)}"
-            
-        # Clean up failed connection
-        if _client:
-            _client.close()
-            _client = None
-            _database = None
-            
-        # Wait a bit before trying next strategy
-        await asyncio.sleep(1)
-    
-    # All strategies failed
-    print(f"\n❌ All connection strategies failed!")
-    print(f"Last error: {last_error}")
-    print("\n🔧 Troubleshooting suggestions:")
-    print("1. Check MongoDB Atlas cluster is running")
-    print("2. Verify network access allows 0.0.0.0/0")
-    print("3. Check connection string format")
-    print("4. Try restarting the Streamlit app")
-    
-    raise Exception(f"Could not connect to MongoDB Atlas. Last error: {last_error}")
+            last_error = _strategy_error(strategy_name, e)
+    return None, None, last_error
+
+async def _try_strategy(option_func, mongo_uri: str, timeout: float) -> AsyncIOMotorClient:
+    """Opens a client with one strategy's options and pings it, returning the live client."""
+    client = AsyncIOMotorClient(mongo_uri, **option_func())
+    try:
+        await asyncio.wait_for(client.admin.command('hello'), timeout=timeout)
+    except BaseException:
+        # Also runs on cancellation, so losing strategies never leak a client
+        client.close()
+        raise
+    return client
 
 def get_render_optimized_options():
     """Render platform optimized configuration."""
@@ -100,15 +221,14 @@ def get_render_optimized_options():
         "serverSelectionTimeoutMS": 30000,  # Longer timeout for Render cold starts
         "connectTimeoutMS": 30000,
         "socketTimeoutMS": 30000,
-        "maxPoolSize": 10,
-        "minPoolSize": 2,
+        **get_pool_options(),
         "maxIdleTimeMS": 30000,
         "retryWrites": True,
         "retryReads": True,
         "heartbeatFrequencyMS": 10000,  # More frequent heartbeats
         "serverSelectionRetryDelayMS": 200,
         # Render-specific optimizations
-        "compressors": "snappy,zlib",
+        "compressors": "zlib",
         "readConcern": "local",
         "writeConcern": {"w": "majority", "wtimeout": 10000},
     }
@@ -119,43 +239,41 @@ def get_standard_ssl_options():
         "serverSelectionTimeoutMS": 15000,
         "connectTimeoutMS": 15000,
         "socketTimeoutMS": 15000,
-        "maxPoolSize": 5,
-        "minPoolSize": 1,
+        **get_pool_options(),
         "maxIdleTimeMS": 15000,
+        "compressors": "zlib",
         "retryWrites": True,
         "retryReads": True,
     }
 
 def get_relaxed_ssl_options():
     """Relaxed SSL configuration for cloud environments."""
-    try:
-        import certifi
-        return {
-            "serverSelectionTimeoutMS": 20000,
-            "connectTimeoutMS": 20000,
-            "socketTimeoutMS": 20000,
-            "maxPoolSize": 3,
-            "minPoolSize": 1,
-            "retryWrites": True,
-            "retryReads": True,
-            "tls": True,
-            "tlsCAFile": certifi.where(),
-            "tlsInsecure": True,  # Allow insecure connections for cloud compatibility
-        }
-    except ImportError:
+    if _CA is None:
         return get_minimal_ssl_options()
+    return {
+        "serverSelectionTimeoutMS": 20000,
+        "connectTimeoutMS": 20000,
+        "socketTimeoutMS": 20000,
+        **get_pool_options(),
+        "retryWrites": True,
+        "retryReads": True,
+        "tls": True,
+        "tlsCAFile": _CA,
+    }
 
 def get_minimal_ssl_options():
     """Minimal SSL configuration."""
-    return {
+    options = {
         "serverSelectionTimeoutMS": 25000,
         "connectTimeoutMS": 25000,
         "socketTimeoutMS": 25000,
-        "maxPoolSize": 2,
-        "minPoolSize": 1,
+        **get_pool_options(),
         "retryWrites": True,
         "tls": True,
     }
+    if _CA is not None:
+        options["tlsCAFile"] = _CA
+    return options
 
 def get_basic_options():
     """Most basic connection options - SSL disabled for cloud compatibility."""
@@ -163,7 +281,7 @@ def get_basic_options():
         "serverSelectionTimeoutMS": 30000,
         "connectTimeoutMS": 30000,
         "socketTimeoutMS": 30000,
-        "maxPoolSize": 1,
+        **get_pool_options(),
         "retryWrites": True,
         "tls": False,  # Completely disable SSL as last resort
         "ssl": False,
@@ -175,8 +293,7 @@ def get_streamlit_cloud_options():
         "serverSelectionTimeoutMS": 45000,
         "connectTimeoutMS": 45000,
         "socketTimeoutMS": 45000,
-        "maxPoolSize": 1,
-        "minPoolSize": 0,
+        **get_pool_options(),
         "retryWrites": True,
         "retryReads": False,
         "directConnection": False,
@@ -2,13 +2,69 @@ import asyncio
 import os
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import List, Type
+from typing import List, Set, Type
 from beanie import Document
 import certifi
+from database.client_singleton import close_shared_client, get_connect_lock, get_motor_client, get_shared_client
 
 # Global variables to store the client and database
 _client: AsyncIOMotorClient = None
 _database = None
+# Models registered by a completed init_beanie, so later calls skip the model setup entirely
+_initialized_models: Set[Type[Document]] = set()
+
+# Resolved once at import rather than on every connection attempt
+_CERTIFI_PATH = certifi.where()
+
+# Static client options; pool bounds and Atlas TLS keys are layered on top
+_BASE_CLIENT_OPTIONS = {
+    "serverSelectionTimeoutMS": 60000,  # Generous server selection window for cold starts
+    "connectTimeoutMS": 20000,
+    "socketTimeoutMS": 30000,
+    "maxIdleTimeMS": 30000,
+    "retryWrites": True,
+    "retryReads": True,
+    "compressors": "zlib",  # Wire compression for embedding-heavy payloads (zlib ships with Python)
+}
+
+def build_client_options(mongo_uri: str) -> dict:
+    """
+    Returns the Motor client options: base settings, pool bounds and, for Atlas, TLS.
+    """
+    client_options = {**_BASE_CLIENT_OPTIONS, **get_pool_options()}
+    
+    # Add SSL configuration for Atlas (with Streamlit Cloud compatibility)
+    if "mongodb+srv://" in mongo_uri:
+        client_options["tls"] = True
+        client_options["tlsCAFile"] = _CERTIFI_PATH
+        
+        # Certificates are validated in every environment; slow cloud
+        # handshakes are covered by the server selection timeout instead
+        client_options["tlsAllowInvalidCertificates"] = False
+        client_options["tlsAllowInvalidHostnames"] = False
+    
+    return client_options
+
+def get_pool_options() -> dict:
+    """
+    Returns the Motor connection pool bounds, configurable through the environment.
+    """
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "5")),
+        # Fail fast when the pool is exhausted instead of hanging
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    }
+
+def _is_connected() -> bool:
+    """True while our client is still the live shared client; resets state once it is not."""
+    global _client, _database
+    if _client is not None and _client is not get_shared_client():
+        # Closed by another module, or registered by a different event loop
+        _client = None
+        _database = None
+        _initialized_models.clear()
+    return _client is not None
 
 async def connect_db(document_models: List[Type[Document]]):
     """
@@ -17,80 +73,70 @@ async def connect_db(document_models: List[Type[Document]]):
     """
     global _client, _database
     
-    mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
-    if not mongo_uri:
-        raise ValueError("MONGODB_CONNECTION_STRING environment variable not set.")
-    
-    mongo_db = os.getenv("DATABASE_NAME", "document_analysis")
-    if not mongo_db:
-        raise ValueError("DATABASE_NAME environment variable not set.")
-    
-    # Check if this is an Atlas connection
-    is_atlas = "mongodb+srv://" in mongo_uri
-    environment = os.getenv("ENVIRONMENT", "development")
-    
-    db_type = "Atlas Cloud" if is_atlas else "Local"
-    print(f"Connecting to MongoDB ({db_type}) in {environment} mode...")
+    # Fast path: the client is already connected and these models are initialized
+    if _is_connected() and _initialized_models.issuperset(document_models):
+        return True
     
-    try:
-        # Configure client options for cloud hosting
-        client_options = {
-            "serverSelectionTimeoutMS": 30000,  # 30 second timeout
-            "connectTimeoutMS": 30000,
-            "socketTimeoutMS": 30000,
-            "maxPoolSize": 10,  # Connection pooling
-            "minPoolSize": 1,
-            "maxIdleTimeMS": 30000,
-            "retryWrites": True,
-            "retryReads": True,
-        }
+    async with get_connect_lock():
+        # Another caller may have connected while we waited for the lock
+        if _is_connected() and _initialized_models.issuperset(document_models):
+            return True
         
-        # Add SSL configuration for Atlas (with Streamlit Cloud compatibility)
-        if is_atlas:
-            # Try different SSL configurations for cloud environments
-            try:
-                import ssl
-                client_options["tls"] = True
-                client_options["tlsCAFile"] = certifi.where()
-                
-                # For cloud environments like Streamlit Cloud
-                if environment == "production":
-                    # More permissive SSL for cloud deployment issues
-                    client_options["tlsInsecure"] = True
-                else:
-                    # Strict SSL for development
-                    client_options["tlsAllowInvalidCertificates"] = False
-                    client_options["tlsAllowInvalidHostnames"] = False
-                    
-            except Exception as ssl_error:
-                print(f"SSL configuration warning: {ssl_error}")
-                # Fallback to basic TLS
-                client_options["tls"] = True
+        # Already connected: reuse the client and only register the new models
+        if _is_connected():
+            models = list(_initialized_models.union(document_models))
+            await init_beanie(database=_database, document_models=models)
+            _initialized_models.update(models)
+            return True
         
-        # Create MongoDB client with enhanced options
-        _client = AsyncIOMotorClient(mongo_uri, **client_options)
-        _database = _client[mongo_db]
+        mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
+        if not mongo_uri:
+            raise ValueError("MONGODB_CONNECTION_STRING environment variable not set.")
         
-        # Test the connection
-        await _client.admin.command('hello')
+        mongo_db = os.getenv("DATABASE_NAME", "document_analysis")
+        if not mongo_db:
+            raise ValueError("DATABASE_NAME environment variable not set.")
         
-        # Initialize Beanie with the database and document models
-        await init_beanie(database=_database, document_models=document_models)
+        # Check if this is an Atlas connection
+        is_atlas = "mongodb+srv://" in mongo_uri
+        environment = os.getenv("ENVIRONMENT", "development")
         
-        print(f"✅ Successfully connected to MongoDB database: {mongo_db}")
-        print(f"✅ Database initialized with {len(document_models)} document models")
+        db_type = "Atlas Cloud" if is_atlas else "Local"
+        print(f"Connecting to MongoDB ({db_type}) in {environment} mode...")
         
-        return True
+        try:
+            # Reuse the process-wide client when another entry point already connected,
+            # otherwise create it with the cloud hosting options from build_client_options
+            _client = get_motor_client()
+            _database = _client[mongo_db]
+        
+            # Optional explicit ready-check; otherwise the driver's background monitoring
+            # discovers the topology and init_beanie's first command surfaces any error
+            if os.getenv("MONGO_VERIFY_ON_CONNECT", "false").lower() in ("1", "true", "yes"):
+                await _client.admin.command('hello')
+        
+            # Initialize Beanie with the database and document models
+            await init_beanie(database=_database, document_models=document_models)
+            _initialized_models.update(document_models)
+        
+            print(f"✅ Successfully connected to MongoDB database: {mongo_db}")
+            print(f"✅ Database initialized with {len(document_models)} document models")
+        
+            return True
         
-    except Exception as e:
-        print(f"❌ Failed to connect to MongoDB: {e}")
-        if is_atlas:
-            print("📋 Atlas connection troubleshooting:")
-            print("   1. Check your connection string format")
-            print("   2. Verify username/password are correct")
-            print("   3. Ensure your IP is whitelisted in Atlas")
-            print("   4. Check if the cluster is running")
-        raise
+        except Exception as e:
+            print(f"❌ Failed to connect to MongoDB: {e}")
+            # Drop the half-initialized client so the next call retries cleanly
+            close_shared_client()
+            _client = None
+            _database = None
+            if is_atlas:
+                print("📋 Atlas connection troubleshooting:")
+                print("   1. Check your connection string format")
+                print("   2. Verify username/password are correct")
+                print("   3. Ensure your IP is whitelisted in Atlas")
+                print("   4. Check if the cluster is running")
+            raise
 
 def get_database():
     """
@@ -1,21 +1,161 @@
 # database/models/document_chunk_model.py
-from beanie import Document
-from typing import List, Optional
-from datetime import datetime
+from beanie import Document, PydanticObjectId
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo import ASCENDING, TEXT, IndexModel
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field
 import os
 
+import numpy as np
+
+# BSON vector layout: a dtype byte and a padding byte, followed by little-endian values
+_FLOAT32_VECTOR_HEADER = BinaryVectorDtype.FLOAT32.value + b"\x00"
+_INT8_VECTOR_HEADER = BinaryVectorDtype.INT8.value + b"\x00"
+
+# Storage precision for embeddings: "float32" (default) or "int8" (scalar-quantized,
+# 4x smaller; cosine similarity is unaffected by the per-vector scale)
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+
+# Leading embedding dimensions kept (Matryoshka-style truncation, then re-normalized);
+# the default keeps all 768 dimensions of embedding-001
+EMBEDDING_DIMS = int(os.getenv("EMBEDDING_DIMS", "768"))
+
+def reduce_embedding_matrix(matrix: np.ndarray) -> np.ndarray:
+    """
+    Truncates a float32 matrix of embeddings (one per row) to EMBEDDING_DIMS and rescales
+    the rows to unit length, so the vector index can rank by dot product instead of cosine.
+    """
+    matrix = matrix[:, :EMBEDDING_DIMS]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def reduce_embeddings(vectors: List[List[float]]) -> List[List[float]]:
+    """List form of reduce_embedding_matrix."""
+    if not vectors:
+        return vectors
+    return reduce_embedding_matrix(np.asarray(vectors, dtype=np.float32)).tolist()
+
+def embedding_cache_namespace(model_name: str, task_type: str) -> str:
+    """
+    The embedding cache 'model' value for vectors from one model and task type, reduced to
+    EMBEDDING_DIMS and unit length; changing any of these starts a separate cache namespace.
+    """
+    return f"{model_name}|{task_type}|{EMBEDDING_DIMS}d|unit"
+
+def embedding_cache_id(namespace: str, content_hash: str) -> str:
+    """Embedding cache document id; namespaced so configurations never overwrite each other."""
+    return f"{namespace}:{content_hash}"
+
+def quantize_int8(vector: Sequence[float]) -> Tuple[np.ndarray, float]:
+    """Scalar-quantizes a vector to int8, returning the values and the scale to multiply them by."""
+    values = np.asarray(vector, dtype=np.float32)
+    max_abs = float(np.max(np.abs(values))) if values.size else 0.0
+    scale = max_abs / 127 if max_abs > 0 else 1.0
+    return np.round(values / scale).astype(np.int8), scale
+
+def pack_embedding(vector: Sequence[float]) -> Binary:
+    """Packs an embedding into a BSON vector (binData subtype 9) in the configured storage dtype."""
+    if EMBEDDING_STORAGE_DTYPE == "int8":
+        return Binary(_INT8_VECTOR_HEADER + quantize_int8(vector)[0].tobytes(), subtype=9)
+    return Binary(_FLOAT32_VECTOR_HEADER + np.asarray(vector, dtype="<f4").tobytes(), subtype=9)
+
+def store_embedding(chunk_data: Dict[str, Any]):
+    """Packs a list or numpy embedding in chunk_data in place, recording the scale of int8 vectors."""
+    vector = chunk_data.get('embedding')
+    if not isinstance(vector, (list, np.ndarray)):
+        return
+    if EMBEDDING_STORAGE_DTYPE == "int8":
+        values, scale = quantize_int8(vector)
+        chunk_data['embedding'] = Binary(_INT8_VECTOR_HEADER + values.tobytes(), subtype=9)
+        chunk_data['embedding_scale'] = scale
+    else:
+        chunk_data['embedding'] = pack_embedding(vector)
+
+def decode_embedding(data: Union[bytes, List[float]], scale: Optional[float] = None) -> np.ndarray:
+    """
+    Decodes a packed float32 or int8 embedding into a float32 array, dequantizing int8 by scale.
+    Chunks stored before embeddings were packed hold a plain array of doubles, which is converted as is.
+    """
+    if isinstance(data, list):
+        return np.asarray(data, dtype=np.float32)
+    if data[:len(_INT8_VECTOR_HEADER)] == _INT8_VECTOR_HEADER:
+        values = np.frombuffer(data, dtype=np.int8, offset=len(_INT8_VECTOR_HEADER))
+        return values.astype(np.float32) * (scale or 1.0)
+    return np.frombuffer(data, dtype="<f4", offset=len(_FLOAT32_VECTOR_HEADER))
+
+def unpack_embedding(data: Union[bytes, List[float]]) -> List[float]:
+    """Unpacks a BSON vector back into a list of values (int8 vectors are not rescaled)."""
+    if isinstance(data, list):
+        return data
+    if not isinstance(data, Binary):
+        data = Binary(data, subtype=9)
+    return data.as_vector().data
+
 class DocumentChunk(Document):
     document_id: str  # Unique identifier for the source document
     document_name: str  # Original filename or document title
     document_type: str  # Type of document (pdf, txt, docx, etc.)
     chunk_index: int  # Order of this chunk within the document
     text_content: str  # The actual text content of this chunk
-    embedding: Optional[List[float]] = None  # The vector embedding of text_content
+    content_hash: Optional[str] = None  # blake2b digest of text_content, same key as the embedding cache
+    embedding: Optional[Union[bytes, List[float]]] = None  # Vector embedding of text_content, packed with pack_embedding (legacy chunks: array of doubles)
+    embedding_scale: Optional[float] = None  # Dequantization scale when the embedding is stored as int8
     page_number: Optional[int] = None  # Page number if applicable
     section_title: Optional[str] = None  # Section or heading if available
     char_start: Optional[int] = None  # Start character position in original document
     char_end: Optional[int] = None  # End character position in original document
-    timestamp: datetime = datetime.utcnow()  # When this chunk was processed
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))  # When this chunk was processed
+
+    @property
+    def embedding_vec(self) -> Optional[np.ndarray]:
+        """The embedding as a float32 numpy array, or None if not set."""
+        if self.embedding is None:
+            return None
+        return decode_embedding(self.embedding, self.embedding_scale)
+
+    @embedding_vec.setter
+    def embedding_vec(self, vector: Optional[Sequence[float]]):
+        if vector is None:
+            self.embedding = None
+            self.embedding_scale = None
+            return
+        fields = {'embedding': list(vector)}
+        store_embedding(fields)
+        self.embedding = fields['embedding']
+        self.embedding_scale = fields.get('embedding_scale')
+
+    @classmethod
+    async def find_for_retrieval(cls, query: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields raw chunk documents as dicts, skipping Beanie hydration and the embedding field."""
+        cursor = cls.get_motor_collection().find(query or {}, projection={"embedding": 0})
+        async for doc in cursor:
+            yield doc
 
     class Settings:
         name = os.getenv("COLLECTION_NAME", "document_chunks")  # Collection name
+        # Created by init_beanie; the (document_id, chunk_index) prefix also serves
+        # per-document filters, deletes and the document-list grouping
+        indexes = [
+            IndexModel([("document_id", ASCENDING), ("chunk_index", ASCENDING)], name="document_id_chunk_index"),
+            # Serves the $text fallback when vector search is unavailable
+            IndexModel([("text_content", TEXT)], name="text_content_text"),
+            # Lets ingestion reuse embeddings of chunks already stored with the same content
+            IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+        ]
+
+class DocumentChunkProjection(BaseModel):
+    """DocumentChunk without the embedding, for reads that never look at the vector."""
+    id: Optional[PydanticObjectId] = Field(default=None, alias="_id")
+    document_id: str
+    document_name: str
+    document_type: str
+    chunk_index: int
+    text_content: str
+    content_hash: Optional[str] = None
+    page_number: Optional[int] = None
+    section_title: Optional[str] = None
+    char_start: Optional[int] = None
+    char_end: Optional[int] = None
+    timestamp: Optional[datetime] = None
@@ -7,11 +7,17 @@ import os
 import asyncio
 import sys
 import time
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
 
 load_dotenv()
 
+# Bounded pool for the blocking embed calls, so concurrent tests can't open
+# dozens of connections at once and trigger the throttling being diagnosed
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embed")
+
 async def diagnose_google_api():
     """Comprehensive diagnosis of Google API issues."""
     
@@ -52,48 +58,48 @@ async def diagnose_google_api():
             "This is a longer test sentence that contains more words and should help us understand if the issue is related to text length or not."
         ]
         
-        for i, text in enumerate(test_texts, 1):
-            print(f"\n   Test {i} - Text length: {len(text)} chars")
-            try:
-                start_time = time.time()
-                
-                # Test with direct API call
-                result = await asyncio.to_thread(
+        print(f"\n   Batch of {len(test_texts)} texts - lengths: {[len(text) for text in test_texts]} chars")
+        try:
+            start_time = time.time()
+            
+            # Test with a single batched API call (the API accepts a list of texts)
+            result = await asyncio.get_running_loop().run_in_executor(
+                _EMBED_EXECUTOR,
+                functools.partial(
                     genai.embed_content,
                     model="models/embedding-001",
-                    content=text,
+                    content=test_texts,
                     task_type="retrieval_document"
                 )
-                
-                end_time = time.time()
-                duration = end_time - start_time
-                
-                embedding = result['embedding']
-                print(f"   ✅ Success! Dimension: {len(embedding)}, Time: {duration:.2f}s")
-                
-                # Add delay to avoid rate limiting
-                await asyncio.sleep(1)
-                
-            except Exception as e:
-                print(f"   ❌ Failed: {e}")
-                
-                # Specific error analysis
-                error_str = str(e).lower()
-                if "504" in error_str or "deadline exceeded" in error_str:
-                    print("   🚨 This is the 504 Deadline Exceeded error!")
-                    print("   🔍 Possible causes:")
-                    print("      - Google API server overload")
-                    print("      - Network connectivity issues")
-                    print("      - Rate limiting")
-                    print("      - Regional API server issues")
-                elif "quota" in error_str or "limit" in error_str:
-                    print("   🚨 Quota/Rate limit issue detected!")
-                elif "authentication" in error_str or "api key" in error_str:
-                    print("   🚨 API key authentication issue!")
-                elif "permission" in error_str:
-                    print("   🚨 Permission issue - check if embedding API is enabled!")
-                
-                return False
+            )
+            
+            end_time = time.time()
+            duration = end_time - start_time
+            
+            for i, embedding in enumerate(result['embedding'], 1):
+                print(f"   ✅ Test {i} success! Dimension: {len(embedding)}")
+            print(f"   ⏱️ Batch time: {duration:.2f}s")
+            
+        except Exception as e:
+            print(f"   ❌ Failed: {e}")
+            
+            # Specific error analysis
+            error_str = str(e).lower()
+            if "504" in error_str or "deadline exceeded" in error_str:
+                print("   🚨 This is the 504 Deadline Exceeded error!")
+                print("   🔍 Possible causes:")
+                print("      - Google API server overload")
+                print("      - Network connectivity issues")
+                print("      - Rate limiting")
+                print("      - Regional API server issues")
+            elif "quota" in error_str or "limit" in error_str:
+                print("   🚨 Quota/Rate limit issue detected!")
+            elif "authentication" in error_str or "api key" in error_str:
+                print("   🚨 API key authentication issue!")
+            elif "permission" in error_str:
+                print("   🚨 Permission issue - check if embedding API is enabled!")
+            
+            return False
         
         print("\n✅ All embedding tests passed!")
         
@@ -102,11 +108,14 @@ async def diagnose_google_api():
         try:
             async def single_embed(text, index):
                 try:
-                    result = await asyncio.to_thread(
-                        genai.embed_content,
-                        model="models/embedding-001",
-                        content=f"Test {index}: {text}",
-                        task_type="retrieval_document"
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        _EMBED_EXECUTOR,
+                        functools.partial(
+                            genai.embed_content,
+                            model="models/embedding-001",
+                            content=f"Test {index}: {text}",
+                            task_type="retrieval_document"
+                        )
                     )
                     return f"Request {index}: Success"
                 except Exception as e:
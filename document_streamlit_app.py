@@ -1,8 +1,8 @@
 import streamlit as st
 import json
 import os
-import asyncio
 import sys
+import shutil
 from dotenv import load_dotenv
 from pathlib import Path
 import tempfile
@@ -25,17 +25,11 @@ sys.path.append(os.path.dirname(__file__))
 
 # Import document-based MCP components
 from MCP.tools.document_tools import (
+    get_background_loop,
     upload_and_process_document_sync,
-    search_documents_sync,
+    search_documents_stream_sync,
     list_documents_sync
 )
-# Import both connection methods
-try:
-    from database.cloud_connection import connect_db_cloud_safe as connect_db
-    from database.cloud_connection import get_database
-except ImportError:
-    from database.connection import connect_db, get_database
-from database.models.document_chunk_model import DocumentChunk
 
 st.set_page_config(
     page_title="Document Analysis MCP Chat", 
@@ -51,15 +45,10 @@ st.markdown("Upload documents and ask questions about them using natural languag
 def init_database():
     """Initialize database connection synchronously"""
     try:
-        # Create a dedicated event loop for database initialization
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(connect_db(document_models=[DocumentChunk]))
-            return True
-        finally:
-            # Don't close the loop here as it might be needed later
-            pass
+        # Connect once on the shared background loop that every *_sync call runs on,
+        # so the Motor client and Beanie init are reused instead of tied to a throwaway loop
+        get_background_loop()
+        return True
     except Exception as e:
         error_msg = str(e)
         st.error(f"Database connection failed: {error_msg}")
@@ -88,6 +77,24 @@ def init_database():
 if not init_database():
     st.stop()
 
+@st.cache_resource
+def _document_list_version() -> dict:
+    """Process-wide version counter, so an upload or refresh in any session invalidates the list"""
+    return {"value": 0}
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_documents_cached(version: int) -> dict:
+    """Return the document list; bumping the version after an upload or refresh bypasses the cached copy"""
+    docs_result = list_documents_sync()
+    if not docs_result.get("success"):
+        # Exceptions aren't cached, so a failed fetch is retried on the next rerun
+        raise RuntimeError(docs_result.get("error", "Failed to list documents"))
+    return docs_result
+
+def invalidate_documents_cache():
+    """Force the next get_documents_cached() call to re-fetch from the database"""
+    _document_list_version()["value"] += 1
+
 # Sidebar for document management
 with st.sidebar:
     st.header("📁 Document Management")
@@ -111,7 +118,9 @@ with st.sidebar:
             with st.spinner("Processing document..."):
                 # Save uploaded file to temporary location
                 with tempfile.NamedTemporaryFile(delete=False, suffix=Path(uploaded_file.name).suffix) as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
+                    # Stream the upload in 1MB chunks instead of copying it into memory first
+                    uploaded_file.seek(0)
+                    shutil.copyfileobj(uploaded_file, tmp_file, length=1024 * 1024)
                     tmp_file_path = tmp_file.name
                 
                 try:
@@ -125,6 +134,7 @@ with st.sidebar:
                     if result.get("success"):
                         st.success(f"✅ {result['message']}")
                         st.info(f"Created {result['chunks_created']} chunks")
+                        invalidate_documents_cache()
                         # Clear the file uploader by rerunning
                         st.rerun()
                     else:
@@ -144,11 +154,15 @@ with st.sidebar:
     st.subheader("📚 Stored Documents")
     
     if st.button("🔄 Refresh Document List"):
-        st.cache_resource.clear()
+        # Only drop the cached list; clearing cache_resource would also drop the DB connection
+        invalidate_documents_cache()
     
     # Get and display document list
     with st.spinner("Loading documents..."):
-        docs_result = list_documents_sync()
+        try:
+            docs_result = get_documents_cached(_document_list_version()["value"])
+        except RuntimeError as e:
+            docs_result = {"success": False, "documents": [], "error": str(e)}
         
         if docs_result.get("success") and docs_result.get("documents"):
             documents = docs_result["documents"]
@@ -193,24 +207,36 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # Display chat messages from history
-for message in st.session_state.messages:
+def render_message_context(retrieved_chunks: list, source_documents: list):
+    """Render the retrieved chunks and source documents of an assistant message"""
+    if retrieved_chunks:
+        with st.expander("📖 Retrieved Context"):
+            for chunk in retrieved_chunks:
+                # One markdown element per chunk instead of one per field
+                lines = [
+                    f"**Document:** {chunk.get('document_name', 'N/A')}",
+                    f"**Chunk:** {chunk.get('chunk_index', 'N/A')}",
+                ]
+                if chunk.get('page_number'):
+                    lines.append(f"**Page:** {chunk.get('page_number')}")
+                lines.append(f"**Content:** {chunk.get('text_content', 'N/A')}")
+                lines.append(f"**Relevance Score:** {chunk.get('score', 'N/A'):.4f}")
+                lines.append("---")
+                st.markdown("\n\n".join(lines))
+    
+    if source_documents:
+        with st.expander("📚 Source Documents"):
+            st.markdown("\n".join(f"- {doc}" for doc in source_documents))
+
+@st.fragment
+def render_message(message: dict):
+    """Render one chat history message; as a fragment it can rerun without the whole page"""
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if "retrieved_chunks" in message and message["retrieved_chunks"]:
-            with st.expander("📖 Retrieved Context"):
-                for chunk in message["retrieved_chunks"]:
-                    st.write(f"**Document:** {chunk.get('document_name', 'N/A')}")
-                    st.write(f"**Chunk:** {chunk.get('chunk_index', 'N/A')}")
-                    if chunk.get('page_number'):
-                        st.write(f"**Page:** {chunk.get('page_number')}")
-                    st.markdown(f"**Content:** {chunk.get('text_content', 'N/A')}")
-                    st.markdown(f"**Relevance Score:** {chunk.get('score', 'N/A'):.4f}")
-                    st.markdown("---")
-        
-        if "source_documents" in message and message["source_documents"]:
-            with st.expander("📚 Source Documents"):
-                for doc in message["source_documents"]:
-                    st.write(f"• {doc}")
+        render_message_context(message.get("retrieved_chunks"), message.get("source_documents"))
+
+for message in st.session_state.messages:
+    render_message(message)
 
 # User Input and Document Search
 if prompt := st.chat_input("Ask a question about your documents..."):
@@ -225,37 +251,22 @@ if prompt := st.chat_input("Ask a question about your documents..."):
                 # Determine document_id filter
                 document_id = st.session_state.get('selected_document_id', None)
                 
-                # Call document search function
-                result = search_documents_sync(
+                # Stream the document search: the retrieved context arrives first,
+                # then the answer is rendered token by token as the LLM generates it
+                events = search_documents_stream_sync(
                     query_text=prompt, 
                     document_id=document_id, 
                     limit=5
                 )
+                context = next(events, {})
+                answer = st.write_stream(event["content"] for event in events)
                 
-                if result and result.answer:
-                    answer = result.answer
-                    retrieved_chunks = [chunk.model_dump() for chunk in result.retrieved_chunks]
-                    source_documents = result.source_documents
-
-                    st.markdown(answer)
-                    
-                    # Show retrieved context
-                    if retrieved_chunks:
-                        with st.expander("📖 Retrieved Context"):
-                            for chunk in retrieved_chunks:
-                                st.write(f"**Document:** {chunk.get('document_name', 'N/A')}")
-                                st.write(f"**Chunk:** {chunk.get('chunk_index', 'N/A')}")
-                                if chunk.get('page_number'):
-                                    st.write(f"**Page:** {chunk.get('page_number')}")
-                                st.markdown(f"**Content:** {chunk.get('text_content', 'N/A')}")
-                                st.markdown(f"**Relevance Score:** {chunk.get('score', 'N/A'):.4f}")
-                                st.markdown("---")
+                if answer:
+                    retrieved_chunks = context.get("retrieved_chunks", [])
+                    source_documents = context.get("source_documents", [])
                     
-                    # Show source documents
-                    if source_documents:
-                        with st.expander("📚 Source Documents"):
-                            for doc in source_documents:
-                                st.write(f"• {doc}")
+                    # Show retrieved context and source documents
+                    render_message_context(retrieved_chunks, source_documents)
 
                     st.session_state.messages.append({
                         "role": "assistant",
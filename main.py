@@ -4,39 +4,55 @@ Main entry point for both MCP server and web deployment.
 Railway/cloud platforms automatically detect and run this file.
 """
 
-import subprocess
-import sys
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Import MCP server components
-from MCP.tools.document_tools import app as document_mcp_server
-server = document_mcp_server
+# Deployment environment, detected once at import (Railway/Heroku/Render set these)
+_IS_WEB = bool(
+    os.environ.get("PORT")
+    or os.environ.get("RAILWAY_ENVIRONMENT")
+    or os.environ.get("RENDER")
+    or os.environ.get("RENDER_SERVICE_NAME")
+)
+
+def get_server():
+    """Import the MCP server on demand; the Streamlit launch path never needs the RAG stack."""
+    from MCP.tools.document_tools import app as document_mcp_server
+    return document_mcp_server
+
+def __getattr__(name):
+    # PEP 562: `mcp run main:server` still resolves `server`, but only when it is asked for
+    if name == "server":
+        return get_server()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def run_streamlit_app():
     """Run the Streamlit application for web deployment."""
     
+    # Imported here so the MCP path never pays for loading Streamlit
+    from streamlit.web import bootstrap
+    
     # Get the port from environment (Railway/Heroku set this)
     port = os.environ.get("PORT", "8080")
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "document_streamlit_app.py")
     
-    # Run Streamlit with cloud deployment configuration
-    cmd = [
-        sys.executable, "-m", "streamlit", "run", 
-        "document_streamlit_app.py",
-        "--server.port=" + port,
-        "--server.address=0.0.0.0",
-        "--server.headless=true",
-        "--server.enableCORS=false",
-        "--server.enableXsrfProtection=false"
-    ]
+    # Cloud deployment configuration, same as the `streamlit run` flags
+    flag_options = {
+        "server.port": int(port),
+        "server.address": "0.0.0.0",
+        "server.headless": True,
+        "server.enableCORS": False,
+        "server.enableXsrfProtection": False,
+    }
     
     print(f"🚀 Starting Streamlit app on port {port}")
-    print(f"Command: {' '.join(cmd)}")
     
-    # Run the application
-    subprocess.run(cmd)
+    # Run Streamlit in this process: no second interpreter start-up, and platform
+    # signals (SIGTERM on redeploy) reach the server directly
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(app_path, False, [], flag_options)
 
 def run_mcp_server():
     """Run the MCP server for local development."""
@@ -46,7 +62,7 @@ def run_mcp_server():
 
 if __name__ == "__main__":
     # Check if we're in a web deployment environment
-    if os.environ.get("PORT") or os.environ.get("RAILWAY_ENVIRONMENT") or os.environ.get("RENDER") or os.environ.get("RENDER_SERVICE_NAME"):
+    if _IS_WEB:
         # Web deployment - run Streamlit
         print("Detected web deployment environment - starting Streamlit app")
         run_streamlit_app()
@@ -0,0 +1,109 @@
+# scripts/normalize_embeddings.py
+"""
+One-time backfill: rescales stored float32 chunk embeddings and embedding-cache vectors to
+unit length, as required by a vector index using dotProduct similarity, and clears the
+on-disk embedding cache. Legacy chunk embeddings stored as arrays of doubles are rewritten
+as packed float32 vectors. Safe to re-run; int8 embeddings are skipped and counted.
+Restart running app processes afterwards so their in-process caches are dropped too.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+from bson.binary import Binary
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database.models.document_chunk_model import DocumentChunk, decode_embedding, _FLOAT32_VECTOR_HEADER
+from services.embedding_service import _EMBEDDING_CACHE_COLLECTION, _get_disk_cache
+
+try:
+    from database.cloud_connection import connect_db_cloud_safe as connect_db
+except ImportError:
+    from database.connection import connect_db
+
+# Updates sent per bulk_write
+BATCH_SIZE = 500
+
+# Returned by a normalizer for values it cannot rewrite
+_SKIPPED = object()
+
+def _unit(vector: np.ndarray):
+    """The vector scaled to unit length, or None when it already is (or is all zeros)."""
+    norm = np.linalg.norm(vector)
+    if norm == 0 or abs(norm - 1.0) < 1e-4:
+        return None
+    return vector / norm
+
+async def _rewrite(collection, field: str, normalize) -> tuple:
+    """
+    Applies normalize to every stored field value, writing back the changed ones in batches.
+    Returns the number of values scanned, updated and skipped.
+    """
+    scanned = 0
+    updated = 0
+    skipped = 0
+    updates = []
+    async for doc in collection.find({field: {"$ne": None}}, {field: 1}):
+        scanned += 1
+        value = normalize(doc[field])
+        if value is _SKIPPED:
+            skipped += 1
+            continue
+        if value is None:
+            continue
+        
+        updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: value}}))
+        if len(updates) >= BATCH_SIZE:
+            await collection.bulk_write(updates, ordered=False)
+            updated += len(updates)
+            updates = []
+    
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+        updated += len(updates)
+    return scanned, updated, skipped
+
+def _normalize_chunk_embedding(data):
+    if isinstance(data, list):
+        # Legacy array of doubles: always rewritten, packed, even when already unit length
+        vector = decode_embedding(data)
+        unit = _unit(vector)
+        if unit is not None:
+            vector = unit
+    elif data[:len(_FLOAT32_VECTOR_HEADER)] == _FLOAT32_VECTOR_HEADER:
+        vector = _unit(decode_embedding(data))
+        if vector is None:
+            return None
+    else:
+        return _SKIPPED  # int8 vectors carry a separate scale and are left as they are
+    return Binary(_FLOAT32_VECTOR_HEADER + vector.astype("<f4").tobytes(), subtype=9)
+
+def _normalize_list(values: list):
+    vector = _unit(np.asarray(values, dtype=np.float32))
+    return None if vector is None else vector.tolist()
+
+async def normalize_embeddings():
+    """Rewrites every stored vector that is not already unit length."""
+    load_dotenv()
+    await connect_db([DocumentChunk])
+    chunks = DocumentChunk.get_motor_collection()
+    
+    scanned, updated, skipped = await _rewrite(chunks, "embedding", _normalize_chunk_embedding)
+    print(f"✅ Scanned {scanned} chunks, normalized {updated} embeddings, skipped {skipped} int8 embeddings")
+    
+    # Cached vectors are reused by later ingests, so they must match the stored ones
+    scanned, updated, _ = await _rewrite(chunks.database[_EMBEDDING_CACHE_COLLECTION], "vector", _normalize_list)
+    print(f"✅ Scanned {scanned} cached embeddings, normalized {updated}")
+    
+    disk_cache = _get_disk_cache()
+    if disk_cache is not None:
+        disk_cache.clear()
+        print("✅ Cleared the on-disk embedding cache")
+
+if __name__ == "__main__":
+    asyncio.run(normalize_embeddings())
@@ -1,10 +1,58 @@
 # Alternative embedding service using direct Google GenAI client
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 import os
-from typing import List
+from typing import List, Set, Tuple
 import asyncio
+import threading
 import time
+import weakref
+
+import numpy as np
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from database.models.document_chunk_model import EMBEDDING_DIMS, embedding_cache_namespace, reduce_embedding_matrix
+
+# Maximum embedding requests in flight at once
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+
+# Window in which concurrent single-text embedding calls are merged into one batch request (0 disables)
+EMBED_COALESCE_WINDOW = float(os.getenv("EMBED_COALESCE_WINDOW_MS", "20")) / 1000
+
+class AsyncTokenBucket:
+    """
+    Async token-bucket rate limiter allowing `rate` acquisitions per `period` seconds,
+    with bursts of up to `rate`. Waiters are served in arrival order.
+    The budget is shared by every event loop (and thread) using the bucket.
+    """
+    
+    def __init__(self, rate: float, period: float = 60.0):
+        self.rate = rate
+        self.period = period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        # Guards the token count across threads; asyncio locks order the waiters of each loop
+        self._state_lock = threading.Lock()
+        self._loop_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+    
+    def _take(self) -> float:
+        """Takes a token if one is available; otherwise returns the seconds until one is."""
+        with self._state_lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.period)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * self.period / self.rate
+    
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        lock = self._loop_locks.get(loop)
+        if lock is None:
+            lock = self._loop_locks[loop] = asyncio.Lock()
+        async with lock:
+            while (delay := self._take()) > 0:
+                await asyncio.sleep(delay)
 
 class AlternativeEmbeddingService:
     def __init__(self):
@@ -14,82 +62,183 @@ class AlternativeEmbeddingService:
         
         # Configure the Google GenAI client directly
         genai.configure(api_key=google_api_key)
+        self._api_key = google_api_key
+        
+        # Async gRPC client, created on first use; its channel is bound to the event loop
+        # that created it, so it is rebuilt if the service is used from another loop
+        self._async_client = None
+        self._async_client_loop = None
+        
+        self.model_name = "models/embedding-001"
+        self.task_type = "retrieval_document"
+        # Embedding cache key for this model, task type and output shape
+        self.cache_namespace = embedding_cache_namespace(self.model_name, self.task_type)
         
         # Configuration for retry and rate limiting
         self.max_text_length = 8000  # Limit text length to prevent timeouts
-        self.rate_limit_delay = 2.0  # Increased delay between requests
-        self.last_request_time = 0
+        self.max_batch_size = 100  # Maximum texts per batch embedding request
+        # Requests run concurrently up to EMBED_CONCURRENCY per event loop, within a shared
+        # per-minute request budget; asyncio semaphores are bound to one loop, so one per loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._limiter = AsyncTokenBucket(float(os.getenv("EMBED_REQUESTS_PER_MINUTE", "60")), 60.0)
+        
+        # get_embedding calls waiting for the current coalescing window, per event loop
+        self._pending: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, List[Tuple[str, asyncio.Future]]]" = weakref.WeakKeyDictionary()
+        self._flush_tasks: Set[asyncio.Task] = set()
         
         print("AlternativeEmbeddingService initialized with direct Google GenAI client")
 
-    async def _rate_limit(self):
-        """Implement rate limiting to avoid hitting API limits."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.rate_limit_delay:
-            await asyncio.sleep(self.rate_limit_delay - time_since_last)
-        self.last_request_time = time.time()
-    
-    def _truncate_text(self, text: str) -> str:
+    def _truncate_text(self, text: str, warn: bool = True) -> str:
         """Truncate text to avoid timeouts with large chunks."""
         if len(text) > self.max_text_length:
-            print(f"Warning: Text truncated from {len(text)} to {self.max_text_length} characters")
+            if warn:
+                print(f"Warning: Text truncated from {len(text)} to {self.max_text_length} characters")
             return text[:self.max_text_length]
         return text
     
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Return the concurrency limit for the running loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(EMBED_CONCURRENCY)
+        return semaphore
+    
+    def _get_async_client(self) -> glm.GenerativeServiceAsyncClient:
+        """Return the async client for the running loop, reusing its warm channel across calls."""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self._api_key})
+            self._async_client_loop = loop
+        return self._async_client
+    
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=2, min=4, max=20),
         retry=retry_if_exception_type((Exception,))
     )
-    async def _get_embedding_with_retry(self, text: str) -> List[float]:
-        """Get embedding with retry logic for handling timeouts and errors."""
+    async def _get_embeddings_batch_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for a batch of texts in a single API request, with retry logic."""
+        # Every attempt, including retries, spends a token from the request budget
+        await self._limiter.acquire()
         try:
-            # Use the direct Google GenAI client
-            result = await asyncio.to_thread(
-                genai.embed_content,
-                model="models/embedding-001",
-                content=text,
-                task_type="retrieval_document"
+            # Native async call: concurrent batches are multiplexed on one channel, no thread hop
+            result = await genai.embed_content_async(
+                model=self.model_name,
+                content=texts,
+                task_type=self.task_type,
+                client=self._get_async_client()
             )
             return result['embedding']
         except Exception as e:
-            print(f"Error generating embedding (will retry): {e}")
-            # Check for specific error types
+            print(f"Error generating batch embeddings (will retry): {e}")
             if "504" in str(e) or "Deadline Exceeded" in str(e) or "DEADLINE_EXCEEDED" in str(e):
                 print("Detected deadline exceeded error - increasing retry delay")
                 await asyncio.sleep(5)  # Additional delay for timeout errors
             raise
     
+    def _print_deadline_help(self, e: Exception):
+        """Print troubleshooting hints for 504 Deadline Exceeded errors."""
+        if "504" in str(e) or "Deadline Exceeded" in str(e) or "DEADLINE_EXCEEDED" in str(e):
+            print("\n🚨 DETECTED 504 DEADLINE EXCEEDED ERROR")
+            print("This error typically occurs due to:")
+            print("1. Network connectivity issues")
+            print("2. Google API server overload")
+            print("3. Rate limiting")
+            print("4. Very large text chunks")
+            print("\nSuggestions to resolve:")
+            print("- Wait a few minutes and try again")
+            print("- Reduce document chunk size (try 500-800 characters)")
+            print("- Check your internet connection")
+            print("- Verify your Google API key is valid and has quota")
+            print("- Consider using a different embedding model if available")
+    
     async def get_embedding(self, text: str) -> List[float]:
         """Generates a vector embedding for the given text with error handling and retries."""
+        if EMBED_COALESCE_WINDOW <= 0:
+            return (await self.get_embeddings_batch([text]))[0]
+        
+        # Calls arriving within the window share one batch request
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(loop, [])
+        pending.append((text, future))
+        if len(pending) == 1:
+            task = loop.create_task(self._flush_pending(loop))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        return await future
+    
+    async def _flush_pending(self, loop: asyncio.AbstractEventLoop):
+        """Embeds every text queued during the coalescing window and resolves its waiters."""
+        # The list get_embedding keeps appending to until the window closes
+        pending = self._pending.get(loop, [])
         try:
-            # Apply rate limiting
-            await self._rate_limit()
-            
-            # Truncate text if it's too long
-            processed_text = self._truncate_text(text)
+            await asyncio.sleep(EMBED_COALESCE_WINDOW)
+            # Close the window before the batch call, so later calls start a new one
+            self._pending.pop(loop, None)
             
-            # Get embedding with retry logic
-            return await self._get_embedding_with_retry(processed_text)
+            # Identical texts in the window are embedded once
+            unique_texts = list(dict.fromkeys(text for text, _ in pending))
+            embeddings = dict(zip(unique_texts, await self.get_embeddings_batch(unique_texts)))
+            for text, future in pending:
+                if not future.done():
+                    future.set_result(embeddings[text])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # If the flush was cancelled, later calls must not join this window and its waiters must not hang
+            if self._pending.get(loop) is pending:
+                del self._pending[loop]
+            for _, future in pending:
+                if not future.done():
+                    future.cancel()
+    
+    async def get_embeddings_batch(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """List form of get_embeddings_matrix, in the same order as the input texts."""
+        return (await self.get_embeddings_matrix(texts, batch_size)).tolist()
+    
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 100) -> np.ndarray:
+        """
+        Generates embeddings for many texts, sending up to batch_size texts per API request.
+        Batch requests are dispatched concurrently (bounded by EMBED_CONCURRENCY and the
+        per-minute request budget); each result is written straight into a preallocated
+        float32 matrix, one row per input text in input order.
+        """
+        batch_size = max(1, min(batch_size, self.max_batch_size))
+        
+        # Report truncation once for the whole call instead of once per text
+        truncated_count = sum(1 for text in texts if len(text) > self.max_text_length)
+        if truncated_count:
+            print(f"Warning: {truncated_count} texts truncated to {self.max_text_length} characters")
+        
+        out = None
+        
+        async def embed_batch(start: int):
+            nonlocal out
+            batch = texts[start:start + batch_size]
+            async with self._get_semaphore():
+                embeddings = await self._get_embeddings_batch_with_retry(
+                    [self._truncate_text(text, warn=False) for text in batch]
+                )
+            rows = np.asarray(embeddings, dtype=np.float32)[:, :EMBEDDING_DIMS]
+            # Sized from the first result, so EMBEDDING_DIMS above the model's width cannot misshape it
+            if out is None:
+                out = np.empty((len(texts), rows.shape[1]), dtype=np.float32)
+            out[start:start + len(batch)] = rows
+        
+        try:
+            await asyncio.gather(*(embed_batch(start) for start in range(0, len(texts), batch_size)))
+            if out is None:
+                return np.empty((0, EMBEDDING_DIMS), dtype=np.float32)
+            return reduce_embedding_matrix(out)
             
         except Exception as e:
-            error_msg = f"Error generating embedding after retries: {e}"
+            error_msg = f"Error generating batch embeddings after retries: {e}"
             print(error_msg)
             
-            # Check if it's a 504 timeout error specifically
-            if "504" in str(e) or "Deadline Exceeded" in str(e) or "DEADLINE_EXCEEDED" in str(e):
-                print("\n🚨 DETECTED 504 DEADLINE EXCEEDED ERROR")
-                print("This error typically occurs due to:")
-                print("1. Network connectivity issues")
-                print("2. Google API server overload")
-                print("3. Rate limiting")
-                print("4. Very large text chunks")
-                print("\nSuggestions to resolve:")
-                print("- Wait a few minutes and try again")
-                print("- Reduce document chunk size (try 500-800 characters)")
-                print("- Check your internet connection")
-                print("- Verify your Google API key is valid and has quota")
-                print("- Consider using a different embedding model if available")
+            self._print_deadline_help(e)
             
             raise Exception(error_msg)
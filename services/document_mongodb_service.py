@@ -1,68 +1,89 @@
 # services/document_mongodb_service.py
-from database.models.document_chunk_model import DocumentChunk
+from database.models.document_chunk_model import DocumentChunk, DocumentChunkProjection, EMBEDDING_DIMS, decode_embedding, embedding_cache_id, pack_embedding, reduce_embedding_matrix, store_embedding
 from services.alternative_embedding_service import AlternativeEmbeddingService as EmbeddingService
-from typing import List, Dict, Any, Optional
+from services.similarity_kernels import as_matrix, cosine_topk
+from typing import List, Dict, Any, Optional, Union
+from datetime import datetime, timezone
 import os
-from datetime import datetime
+import numpy as np
+from pymongo.errors import BulkWriteError, OperationFailure
+
+# Get database directly (cloud-safe), resolved once at import
+try:
+    from database.cloud_connection import get_database
+except ImportError:
+    from database.connection import get_database
+
+# Maximum number of chunks sent to MongoDB in a single insert_many call
+INSERT_BATCH_SIZE = 1000
+
+# Environment configuration, read once at import
+_VECTOR_INDEX_NAME = os.getenv("VECTOR_INDEX_NAME", "vector_index")
+_COLLECTION_NAME = os.getenv("COLLECTION_NAME", "document_chunks")
+_EMBEDDING_CACHE_COLLECTION = os.getenv("EMBEDDING_CACHE_COLLECTION", "embedding_cache")
+
+# Fields returned for each search result, built once at import
+_RESULT_FIELDS = {
+    "_id": 0,
+    "document_id": 1,
+    "document_name": 1,
+    "document_type": 1,
+    "chunk_index": 1,
+    "text_content": 1,
+    "page_number": 1,
+    "section_title": 1,
+}
+_VECTOR_SEARCH_PROJECT_STAGE = {"$project": {**_RESULT_FIELDS, "score": {"$meta": "vectorSearchScore"}}}
+_TEXT_SEARCH_PROJECTION = {**_RESULT_FIELDS, "score": {"$meta": "textScore"}}
+_LOCAL_SEARCH_PROJECTION = {**_RESULT_FIELDS, "embedding": 1, "embedding_scale": 1}
 
 class DocumentMongoDBService:
     def __init__(self, embedding_service: EmbeddingService):
         self.embedding_service = embedding_service
-        self.vector_index_name = os.getenv("VECTOR_INDEX_NAME", "vector_index")
-        self.collection_name = os.getenv("COLLECTION_NAME", "document_chunks")
+        self.vector_index_name = _VECTOR_INDEX_NAME
+        self.collection_name = _COLLECTION_NAME
+        self.embedding_cache_collection_name = _EMBEDDING_CACHE_COLLECTION
         print(f"DocumentMongoDBService initialized, targeting collection '{self.collection_name}' with vector index '{self.vector_index_name}'")
 
-    async def find_chunks_by_semantic_search(self, query_text: str, document_id: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    async def find_chunks_by_semantic_search(self, query_text: str, document_id: Optional[str] = None, limit: int = 5, query_embedding: Optional[List[float]] = None, document_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Performs a semantic search on document chunks using Atlas Vector Search.
-        Can optionally filter by document_id to search within a specific document.
+        Can optionally filter by document_id to search within a specific document,
+        and by document_type (e.g. "pdf") to search one kind of document.
+        A precomputed query_embedding can be passed to skip re-embedding the query.
         """
-        print(f"Generating embedding for query: '{query_text}'")
-        query_embedding = await self.embedding_service.get_embedding(query_text)
+        if query_embedding is None:
+            print(f"Generating embedding for query: '{query_text}'")
+            query_embedding = await self.embedding_service.get_embedding(query_text)
         print(f"Query embedding generated (first 5 dims): {query_embedding[:5]}...")
 
-        # Build the pipeline with optional document filtering
-        pipeline = [
-            {
-                "$vectorSearch": {
-                    "queryVector": query_embedding,
-                    "path": "embedding",
-                    "numCandidates": 100,
-                    "limit": limit,
-                    "index": self.vector_index_name,
-                }
-            }
-        ]
+        # Build the pipeline; the ANN search runs server-side on the vector index.
+        # The query vector is sent packed in the same BSON vector dtype as the stored
+        # embeddings, instead of an array of doubles
+        vector_search = {
+            "queryVector": pack_embedding(query_embedding),
+            "path": "embedding",
+            "numCandidates": limit * 20,
+            "limit": limit,
+            "index": self.vector_index_name,
+        }
         
-        # Add document filter if specified
+        # Pre-filter inside the vector search (requires the fields to be indexed as
+        # filter fields) so the limit applies to matching chunks only
+        chunk_filter = {}
         if document_id:
-            pipeline.append({
-                "$match": {"document_id": document_id}
-            })
+            chunk_filter["document_id"] = document_id
+        if document_type:
+            chunk_filter["document_type"] = document_type
+        if chunk_filter:
+            vector_search["filter"] = chunk_filter
         
-        # Add projection
-        pipeline.append({
-            "$project": {
-                "_id": 0,
-                "document_id": 1,
-                "document_name": 1,
-                "document_type": 1,
-                "chunk_index": 1,
-                "text_content": 1,
-                "page_number": 1,
-                "section_title": 1,
-                "score": {"$meta": "vectorSearchScore"}
-            }
-        })
+        pipeline = [{"$vectorSearch": vector_search}, _VECTOR_SEARCH_PROJECT_STAGE]
 
         print("Executing vector search pipeline...")
         
         try:
             # Get database and collection directly (cloud-safe)
-            try:
-                from database.cloud_connection import get_database
-            except ImportError:
-                from database.connection import get_database
             db = get_database()
             collection = db[self.collection_name]
             
@@ -77,33 +98,50 @@ class DocumentMongoDBService:
         except Exception as e:
             print(f"Error in vector search: {e}")
             
-            # Fallback: Get documents and do basic filtering
-            print("Falling back to simple document retrieval...")
+            # Without Atlas Vector Search, a single document is small enough to rank exactly in-process
+            if document_id:
+                try:
+                    results = await self._local_vector_search(query_embedding, document_id, limit)
+                    if results:
+                        print(f"Local vector search returned {len(results)} results.")
+                        return results
+                except Exception as local_error:
+                    print(f"Local vector search failed: {local_error}")
+            
+            # Fallback: let MongoDB match the query words through the text index
+            print("Falling back to text search...")
             try:
-                if document_id:
-                    all_chunks = await DocumentChunk.find({"document_id": document_id}).to_list()
-                else:
-                    all_chunks = await DocumentChunk.find_all().to_list()
-                
-                # Simple text matching as fallback
+                try:
+                    cursor = DocumentChunk.get_motor_collection().find(
+                        {"$text": {"$search": query_text}, **chunk_filter}, _TEXT_SEARCH_PROJECTION
+                    ).sort([("score", {"$meta": "textScore"})]).limit(limit)
+                    results = [doc async for doc in cursor]
+                    print(f"Text search returned {len(results)} results.")
+                    return results
+                except OperationFailure as text_error:
+                    # Server rejected the $text query (e.g. the text index is missing)
+                    print(f"Text search unavailable: {text_error}")
+
+                # Last resort: simple word matching in Python, streamed without the embedding vector
                 filtered_chunks = []
                 query_lower = query_text.lower()
                 
-                for chunk in all_chunks:
-                    if any(word in chunk.text_content.lower() for word in query_lower.split()):
+                async for chunk in DocumentChunk.find_for_retrieval(chunk_filter):
+                    if any(word in chunk["text_content"].lower() for word in query_lower.split()):
                         filtered_chunks.append({
-                            "document_id": chunk.document_id,
-                            "document_name": chunk.document_name,
-                            "document_type": chunk.document_type,
-                            "chunk_index": chunk.chunk_index,
-                            "text_content": chunk.text_content,
-                            "page_number": chunk.page_number,
-                            "section_title": chunk.section_title,
+                            "document_id": chunk["document_id"],
+                            "document_name": chunk["document_name"],
+                            "document_type": chunk["document_type"],
+                            "chunk_index": chunk["chunk_index"],
+                            "text_content": chunk["text_content"],
+                            "page_number": chunk.get("page_number"),
+                            "section_title": chunk.get("section_title"),
                             "score": 0.5  # Default score
                         })
+                        # Stop reading once enough matches were found
+                        if len(filtered_chunks) >= limit:
+                            break
                 
-                # Limit results
-                filtered_chunks = filtered_chunks[:limit]
                 print(f"Fallback search returned {len(filtered_chunks)} results.")
                 return filtered_chunks
                 
@@ -111,49 +149,162 @@ class DocumentMongoDBService:
                 print(f"Fallback search also failed: {fallback_error}")
                 return []
 
+    async def _local_vector_search(self, query_embedding: List[float], document_id: str, limit: int) -> List[Dict[str, Any]]:
+        """Exact cosine search over one document's stored embeddings, computed in-process."""
+        docs = []
+        vectors = []
+        async for doc in DocumentChunk.get_motor_collection().find(
+            {"document_id": document_id, "embedding": {"$ne": None}}, _LOCAL_SEARCH_PROJECTION
+        ):
+            vectors.append(decode_embedding(doc.pop("embedding"), doc.pop("embedding_scale", None)))
+            docs.append(doc)
+        
+        if not docs:
+            return []
+        indices, scores = cosine_topk(query_embedding, as_matrix(vectors), limit)
+        return [{**docs[index], "score": float(score)} for index, score in zip(indices, scores)]
+
     async def insert_document_chunk(self, chunk_data: Dict[str, Any]) -> DocumentChunk:
         """Inserts a single document chunk into the database."""
-        # Add timestamp if not provided
-        if 'timestamp' not in chunk_data:
-            chunk_data['timestamp'] = datetime.utcnow()
+        store_embedding(chunk_data)
             
         new_chunk = DocumentChunk(**chunk_data)
         await new_chunk.insert()
-        print(f"Inserted chunk {new_chunk.chunk_index} for document {new_chunk.document_name}")
         return new_chunk
 
     async def insert_document_chunks_batch(self, chunks: List[Dict[str, Any]]) -> List[DocumentChunk]:
-        """Inserts multiple document chunks in batch."""
+        """
+        Inserts multiple document chunks in batch, validated as DocumentChunk models.
+        Use bulk_insert_raw when the Document objects are not needed.
+        """
         document_chunks = []
         for chunk_data in chunks:
-            if 'timestamp' not in chunk_data:
-                chunk_data['timestamp'] = datetime.utcnow()
+            # Store the vector packed (float32 or int8) instead of an array of doubles
+            store_embedding(chunk_data)
             document_chunks.append(DocumentChunk(**chunk_data))
         
         if document_chunks:
-            await DocumentChunk.insert_many(document_chunks)
-            print(f"Inserted {len(document_chunks)} chunks in batch")
+            docs = [chunk.model_dump(exclude={"id", "revision_id"}) for chunk in document_chunks]
+            await self.bulk_insert_raw(docs)
+            
+            # insert_many fills in the generated _id on each raw document
+            for chunk, doc in zip(document_chunks, docs):
+                chunk.id = doc.get("_id")
         
         return document_chunks
 
-    async def get_all_chunks(self, document_id: Optional[str] = None) -> List[DocumentChunk]:
-        """Retrieves all document chunks, optionally filtered by document_id."""
-        if document_id:
-            return await DocumentChunk.find({"document_id": document_id}).to_list()
-        return await DocumentChunk.find_all().to_list()
+    async def bulk_insert_raw(self, chunk_dicts: List[Dict[str, Any]]) -> int:
+        """
+        Inserts chunk dicts straight into the collection, without building Beanie models.
+        Uses unordered bulk inserts split into sub-batches to stay well under MongoDB's
+        16MB message limit. Duplicate keys are skipped; returns the number of inserted chunks.
+        """
+        if not chunk_dicts:
+            return 0
+        
+        timestamp = datetime.now(timezone.utc)
+        for chunk_data in chunk_dicts:
+            # Store the vector packed (float32 or int8) instead of an array of doubles
+            store_embedding(chunk_data)
+            chunk_data.setdefault('timestamp', timestamp)
+        
+        collection = get_database()[self.collection_name]
+        inserted = 0
+        for start in range(0, len(chunk_dicts), INSERT_BATCH_SIZE):
+            try:
+                result = await collection.insert_many(
+                    chunk_dicts[start:start + INSERT_BATCH_SIZE],
+                    ordered=False,
+                    bypass_document_validation=True
+                )
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as bwe:
+                # Tolerate duplicate keys (a retried upload); anything else is a real failure
+                errors = bwe.details.get("writeErrors", [])
+                if any(error.get("code") != 11000 for error in errors):
+                    raise
+                inserted += bwe.details.get("nInserted", 0)
+        
+        print(f"Inserted {inserted} chunks in batch")
+        return inserted
+
+    async def get_cached_embeddings(self, content_hashes: List[str], model: str) -> Dict[str, np.ndarray]:
+        """
+        Looks up previously generated embeddings by content hash in a single query.
+        model is the cache namespace (see embedding_cache_namespace).
+        """
+        if not content_hashes:
+            return {}
+        
+        try:
+            chunks_collection = DocumentChunk.get_motor_collection()
+            collection = chunks_collection.database[self.embedding_cache_collection_name]
+            cached = {}
+            hashes_by_id = {embedding_cache_id(model, h): h for h in content_hashes}
+            async for doc in collection.find({"_id": {"$in": list(hashes_by_id)}}, {"vector": 1}):
+                cached[hashes_by_id[doc["_id"]]] = doc["vector"]
+            
+            # Chunks stored before the cache existed (or after it was cleared) still carry their
+            # embedding; reuse one stored chunk per remaining hash via the content_hash index
+            missing = [h for h in content_hashes if h not in cached]
+            if missing:
+                pipeline = [
+                    {"$match": {"content_hash": {"$in": missing}, "embedding": {"$ne": None}}},
+                    {"$group": {
+                        "_id": "$content_hash",
+                        "embedding": {"$first": "$embedding"},
+                        "embedding_scale": {"$first": "$embedding_scale"},
+                    }},
+                ]
+                async for doc in chunks_collection.aggregate(pipeline):
+                    cached[doc["_id"]] = decode_embedding(doc["embedding"], doc.get("embedding_scale"))
+            
+            # Chunk vectors may predate the current settings: bring every vector to EMBEDDING_DIMS
+            # and unit length, and treat ones with too few dimensions as misses
+            usable = [h for h, vector in cached.items() if len(vector) >= EMBEDDING_DIMS]
+            if not usable:
+                return {}
+            matrix = np.stack([np.asarray(cached[h], dtype=np.float32)[:EMBEDDING_DIMS] for h in usable])
+            return dict(zip(usable, reduce_embedding_matrix(matrix)))
+        except Exception as e:
+            print(f"Error reading embedding cache: {e}")
+            return {}
+
+    async def cache_embeddings(self, embeddings: Dict[str, Union[List[float], np.ndarray]], model: str):
+        """Stores embeddings keyed by content hash so identical text is never re-embedded."""
+        if not embeddings:
+            return
+        
+        # The cache stores plain arrays; numpy rows are converted at this driver boundary
+        docs = [
+            {"_id": embedding_cache_id(model, content_hash), "model": model, "vector": vector.tolist() if isinstance(vector, np.ndarray) else vector}
+            for content_hash, vector in embeddings.items()
+        ]
+        try:
+            collection = DocumentChunk.get_motor_collection().database[self.embedding_cache_collection_name]
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            # Duplicate keys mean another upload already cached the same content
+            pass
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+
+    async def get_all_chunks(self, document_id: Optional[str] = None, include_embeddings: bool = False) -> List[Union[DocumentChunk, DocumentChunkProjection]]:
+        """
+        Retrieves all document chunks, optionally filtered by document_id.
+        Embeddings are left on the server unless include_embeddings is set.
+        """
+        query = DocumentChunk.find({"document_id": document_id}) if document_id else DocumentChunk.find_all()
+        if not include_embeddings:
+            query = query.project(DocumentChunkProjection)
+        return await query.to_list()
 
     async def get_documents_list(self) -> List[Dict[str, Any]]:
         """Get a list of all unique documents in the database."""
         try:
-            # Use cloud-safe database getter
-            try:
-                from database.cloud_connection import get_database
-            except ImportError:
-                from database.connection import get_database
-            db = get_database()
-            collection = db[self.collection_name]
+            collection = DocumentChunk.get_motor_collection()
             
-            # Aggregate to get unique documents
+            # Aggregate to get unique documents, formatting dates server-side
             pipeline = [
                 {
                     "$group": {
@@ -171,7 +322,7 @@ class DocumentMongoDBService:
                         "document_name": 1,
                         "document_type": 1,
                         "chunk_count": 1,
-                        "last_updated": 1
+                        "last_updated": {"$dateToString": {"date": "$last_updated"}}
                     }
                 }
             ]
@@ -189,7 +340,8 @@ class DocumentMongoDBService:
     async def delete_document(self, document_id: str) -> int:
         """Delete all chunks for a specific document."""
         try:
-            result = await DocumentChunk.find({"document_id": document_id}).delete()
+            # Single indexed delete_many on the raw collection
+            result = await DocumentChunk.get_motor_collection().delete_many({"document_id": document_id})
             print(f"Deleted {result.deleted_count} chunks for document {document_id}")
             return result.deleted_count
         except Exception as e:
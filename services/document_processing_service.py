@@ -1,140 +1,281 @@
 # services/document_processing_service.py
 import os
 import uuid
-from typing import List, Dict, Any, Tuple
+import codecs
+from typing import List, Dict, Any, Tuple, AsyncIterator, Callable
 from pathlib import Path
 import asyncio
+import bisect
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: better encoding detection for non-UTF-8 text files
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+# Optional: PDFium text extraction, much faster than PyPDF2's pure-Python parser
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# Size of the blocks read from plain text files
+_READ_BLOCK_SIZE = 64 * 1024
+
+# Bytes sampled from the start of a text file to detect its encoding
+_ENCODING_SAMPLE_SIZE = 4096
+
+# Sentence or paragraph boundary used to pick chunk break points
+_BREAK_PATTERN = re.compile(r'[.\n]')
+
+# PDFium is not thread-safe at the library level, so every call (open, extract, close) from any
+# document runs on this one thread
+_PDFIUM_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdfium")
+
+async def _run_pdfium(func, *args):
+    """Run a PDFium call on the dedicated PDFium thread"""
+    return await asyncio.get_running_loop().run_in_executor(_PDFIUM_EXECUTOR, func, *args)
+
+def _open_pdfium(file_path: str):
+    """Open a PDF with PDFium, returning the document and its page count"""
+    pdf = pdfium.PdfDocument(file_path)
+    return pdf, len(pdf)
+
+def _extract_pdfium_page(pdf, page_index: int) -> str:
+    """Extract the text of a single page with PDFium"""
+    page = pdf[page_index]
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range()
+    finally:
+        textpage.close()
+        page.close()
+
+def _extract_pypdf2_page(pdf_reader, page_index: int) -> str:
+    """Extract the text of a single page with PyPDF2"""
+    return pdf_reader.pages[page_index].extract_text()
+
+class _StreamingChunker:
+    """
+    Splits a stream of text segments into overlapping chunks.
+
+    Only the text from the current chunk start onwards is buffered, so peak memory is
+    bounded by chunk_size plus the largest segment rather than by the document size.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self._buffer = ""
+        self._buffer_start = 0  # Absolute offset of the first buffered character
+        self._start = 0  # Absolute offset of the next chunk
+        self._chunk_index = 0
+        # Absolute offsets just past every buffered sentence/paragraph break
+        self._breaks: List[int] = []
+
+    def feed(self, segment: str) -> List[Dict[str, Any]]:
+        """Add a segment and return the chunks that are now complete."""
+        offset = self._buffer_start + len(self._buffer)
+        self._breaks.extend(offset + match.end() for match in _BREAK_PATTERN.finditer(segment))
+        self._buffer += segment
+        return self._drain(final=False)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Return the remaining chunks once the stream has ended."""
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> List[Dict[str, Any]]:
+        chunks = []
+        text_length = self._buffer_start + len(self._buffer)
+
+        # A chunk is only cut once text beyond its end is known, or the stream has ended
+        while self._start < text_length and (final or self._start + self.chunk_size < text_length):
+            start = self._start
+            end = start + self.chunk_size
+
+            # If not the last chunk, try to break at a sentence or paragraph
+            if end < text_length:
+                # Latest break within the last 100 characters of the chunk
+                idx = bisect.bisect_right(self._breaks, end) - 1
+                if idx >= 0:
+                    break_end = self._breaks[idx]
+                    if break_end - 1 > start and break_end - 1 >= end - 100:
+                        end = break_end
+
+            chunk_text = self._buffer[start - self._buffer_start:end - self._buffer_start].strip()
+
+            if chunk_text:  # Only add non-empty chunks
+                chunks.append({
+                    'chunk_index': self._chunk_index,
+                    'text_content': chunk_text,
+                    'char_start': start,
+                    'char_end': end
+                })
+                self._chunk_index += 1
+
+            # The last chunk reached the end of the text; an overlap tail would only repeat it
+            if end >= text_length:
+                self._start = text_length
+                break
+
+            # Move start position (with overlap), always advancing past the previous start
+            self._start = end - self.overlap if end - self.overlap > start else end
+
+        # Drop text that no future chunk can include
+        if self._start > self._buffer_start:
+            self._buffer = self._buffer[self._start - self._buffer_start:]
+            self._buffer_start = self._start
+            del self._breaks[:bisect.bisect_right(self._breaks, self._start)]
+
+        return chunks
 
 class DocumentProcessingService:
     def __init__(self):
-        self.supported_extensions = {'.txt', '.md', '.pdf', '.docx', '.doc'}
-        
+        # Extractor for each supported (lowercase) file extension
+        self._extractors = {
+            '.txt': self._extract_from_txt,
+            '.md': self._extract_from_txt,
+            '.pdf': self._extract_from_pdf,
+            '.docx': self._extract_from_docx,
+            '.doc': self._extract_from_docx,
+        }
+        self.supported_extensions = set(self._extractors)
+    
     def is_supported_format(self, file_path: str) -> bool:
         """Check if the file format is supported"""
-        return Path(file_path).suffix.lower() in self.supported_extensions
+        return Path(file_path).suffix.lower() in self._extractors
+    
+    def _dispatch_extractor(self, suffix: str) -> Callable[[str], AsyncIterator[str]]:
+        """Return the extractor for a lowercase file extension"""
+        extractor = self._extractors.get(suffix)
+        if extractor is None:
+            raise ValueError(f"Unsupported file format: {suffix}")
+        return extractor
+    
+    def extract_text_from_file(self, file_path: str) -> AsyncIterator[str]:
+        """Stream text content from various file formats as a sequence of segments"""
+        return self._dispatch_extractor(Path(file_path).suffix.lower())(file_path)
     
-    async def extract_text_from_file(self, file_path: str) -> str:
-        """Extract text content from various file formats"""
-        file_extension = Path(file_path).suffix.lower()
+    @staticmethod
+    def _detect_encoding(file_path: str) -> str:
+        """Guess a text file's encoding from a small head sample"""
+        with open(file_path, 'rb') as file:
+            head = file.read(_ENCODING_SAMPLE_SIZE)
         
-        if file_extension == '.txt' or file_extension == '.md':
-            return await self._extract_from_txt(file_path)
-        elif file_extension == '.pdf':
-            return await self._extract_from_pdf(file_path)
-        elif file_extension in ['.docx', '.doc']:
-            return await self._extract_from_docx(file_path)
-        else:
-            raise ValueError(f"Unsupported file format: {file_extension}")
+        try:
+            # Not final: the sample may end in the middle of a multi-byte character
+            codecs.getincrementaldecoder('utf-8')().decode(head)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+        
+        if charset_normalizer is not None:
+            best = charset_normalizer.from_bytes(head).best()
+            if best is not None:
+                return best.encoding
+        return 'latin-1'
     
-    async def _extract_from_txt(self, file_path: str) -> str:
+    async def _extract_from_txt(self, file_path: str) -> AsyncIterator[str]:
         """Extract text from plain text files"""
+        # Undecodable bytes past the sample are replaced rather than failing mid-stream
+        # File I/O runs in a worker thread so large files do not stall the event loop
+        encoding = await asyncio.to_thread(self._detect_encoding, file_path)
+        file = await asyncio.to_thread(open, file_path, 'r', encoding=encoding, errors='replace')
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read()
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(file_path, 'r', encoding='latin-1') as file:
-                return file.read()
+            while block := await asyncio.to_thread(file.read, _READ_BLOCK_SIZE):
+                yield block
+        finally:
+            file.close()
     
-    async def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF files"""
+    async def _extract_from_pdf(self, file_path: str) -> AsyncIterator[str]:
+        """Extract text from PDF files, one page at a time, off the event loop"""
+        if pdfium is not None:
+            pdf, page_count = await _run_pdfium(_open_pdfium, file_path)
+            try:
+                for page_index in range(page_count):
+                    yield await _run_pdfium(_extract_pdfium_page, pdf, page_index) + "\n"
+            finally:
+                await _run_pdfium(pdf.close)
+            return
+        
         try:
             import PyPDF2
-            text = ""
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-            return text
         except ImportError:
-            raise ImportError("PyPDF2 is required for PDF processing. Install with: pip install PyPDF2")
+            raise ImportError("pypdfium2 or PyPDF2 is required for PDF processing. Install with: pip install pypdfium2")
+        
+        # Given a path, PdfReader reads the whole file into memory, so no handle stays open
+        pdf_reader = await asyncio.to_thread(PyPDF2.PdfReader, file_path)
+        page_count = await asyncio.to_thread(len, pdf_reader.pages)
+        for page_index in range(page_count):
+            yield await asyncio.to_thread(_extract_pypdf2_page, pdf_reader, page_index) + "\n"
     
-    async def _extract_from_docx(self, file_path: str) -> str:
-        """Extract text from Word documents"""
+    async def _extract_from_docx(self, file_path: str) -> AsyncIterator[str]:
+        """Extract text from Word documents, one paragraph at a time"""
         try:
             from docx import Document
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
         except ImportError:
             raise ImportError("python-docx is required for Word document processing. Install with: pip install python-docx")
+        
+        # Parsing the whole package is blocking work, so it runs in a worker thread
+        doc = await asyncio.to_thread(Document, file_path)
+        for paragraph in doc.paragraphs:
+            yield paragraph.text + "\n"
     
     def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
         """Split text into overlapping chunks"""
-        chunks = []
-        start = 0
-        chunk_index = 0
-        
-        while start < len(text):
-            # Calculate end position
-            end = start + chunk_size
-            
-            # If not the last chunk, try to break at a sentence or paragraph
-            if end < len(text):
-                # Look for sentence endings within the last 100 characters
-                last_period = text.rfind('.', max(start, end - 100), end)
-                last_newline = text.rfind('\n', max(start, end - 100), end)
-                
-                # Use the latest sentence/paragraph break found
-                break_point = max(last_period, last_newline)
-                if break_point > start:
-                    end = break_point + 1
-            
-            chunk_text = text[start:end].strip()
-            
-            if chunk_text:  # Only add non-empty chunks
-                chunks.append({
-                    'chunk_index': chunk_index,
-                    'text_content': chunk_text,
-                    'char_start': start,
-                    'char_end': end
-                })
-                chunk_index += 1
-            
-            # Move start position (with overlap)
-            start = max(start + 1, end - overlap)
-            
-            # Prevent infinite loop
-            if start >= len(text):
-                break
-        
-        return chunks
+        chunker = _StreamingChunker(chunk_size, overlap)
+        return chunker.feed(text) + chunker.close()
     
-    async def process_document(self, file_path: str, chunk_size: int = 1000, overlap: int = 200) -> Tuple[str, str, List[Dict[str, Any]]]:
+    async def chunk_segments(self, segments: AsyncIterator[str], chunk_size: int = 1000, overlap: int = 200) -> AsyncIterator[Dict[str, Any]]:
+        """Split a stream of text segments into overlapping chunks, yielding each as soon as it is complete"""
+        chunker = _StreamingChunker(chunk_size, overlap)
+        async for segment in segments:
+            for chunk in chunker.feed(segment):
+                yield chunk
+        for chunk in chunker.close():
+            yield chunk
+    
+    async def stream_document(self, file_path: str, chunk_size: int = 1000, overlap: int = 200) -> AsyncIterator[Dict[str, Any]]:
         """
-        Process a document file and return document info and chunks
-        
-        Returns:
-            Tuple of (document_id, document_name, chunks)
+        Process a document file, yielding each chunk with its document metadata as soon as it
+        is formed, so callers can embed early chunks while later pages are still being parsed.
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        if not self.is_supported_format(file_path):
-            raise ValueError(f"Unsupported file format: {Path(file_path).suffix}")
+        path = Path(file_path)
+        suffix = path.suffix.lower()
+        extractor = self._dispatch_extractor(suffix)
         
         # Generate document ID and extract name
         document_id = str(uuid.uuid4())
-        document_name = Path(file_path).name
-        document_type = Path(file_path).suffix.lower()[1:]  # Remove the dot
-        
-        # Extract text from document
-        text_content = await self.extract_text_from_file(file_path)
-        
-        if not text_content.strip():
-            raise ValueError("No text content found in the document")
-        
-        # Create chunks
-        chunks = self.chunk_text(text_content, chunk_size, overlap)
+        document_name = path.name
+        document_type = suffix[1:]  # Remove the dot
         
-        # Add document metadata to each chunk
-        for chunk in chunks:
+        # Stream text from the document straight into the chunker
+        chunk_count = 0
+        async for chunk in self.chunk_segments(extractor(file_path), chunk_size, overlap):
+            # Add document metadata to each chunk
             chunk.update({
                 'document_id': document_id,
                 'document_name': document_name,
                 'document_type': document_type
             })
+            chunk_count += 1
+            yield chunk
         
-        return document_id, document_name, chunks
+        # Chunks are only empty when the document has no non-whitespace text
+        if not chunk_count:
+            raise ValueError("No text content found in the document")
+    
+    async def process_document(self, file_path: str, chunk_size: int = 1000, overlap: int = 200) -> Tuple[str, str, List[Dict[str, Any]]]:
+        """
+        Process a document file and return document info and chunks
+        
+        Returns:
+            Tuple of (document_id, document_name, chunks)
+        """
+        chunks = [chunk async for chunk in self.stream_document(file_path, chunk_size, overlap)]
+        return chunks[0]['document_id'], chunks[0]['document_name'], chunks
@@ -1,10 +1,88 @@
 # listenloom-mcp-server/services/embedding_service.py
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 import os
-from typing import List
+import functools
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
 import asyncio
-import time
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import weakref
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception
+from google.api_core import exceptions as google_exceptions
+from pymongo.errors import BulkWriteError
+from database.models.document_chunk_model import EMBEDDING_DIMS, embedding_cache_id, embedding_cache_namespace, reduce_embedding_matrix, reduce_embeddings
+
+import numpy as np
+
+# Optional: on-disk tier between the in-process LRU and MongoDB that survives restarts
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# Get database directly (cloud-safe), resolved once at import
+try:
+    from database.cloud_connection import get_database
+except ImportError:
+    from database.connection import get_database
+
+# Entries kept in the in-process embedding cache
+EMBEDDING_LRU_SIZE = 4096
+
+# On-disk embedding cache location (empty disables it), size bound and entry lifetime
+EMBEDDING_DISK_CACHE_DIR = os.getenv("EMBEDDING_DISK_CACHE_DIR", "/tmp/embed_cache")
+EMBEDDING_DISK_CACHE_SIZE = 256 << 20
+EMBEDDING_DISK_CACHE_TTL = 86400
+
+_disk_cache = None
+_disk_cache_failed = False
+
+def _get_disk_cache():
+    """The process-wide on-disk cache, or None when diskcache is missing or the directory is unusable."""
+    global _disk_cache, _disk_cache_failed
+    if _disk_cache is None and not _disk_cache_failed and diskcache is not None and EMBEDDING_DISK_CACHE_DIR:
+        try:
+            _disk_cache = diskcache.Cache(
+                EMBEDDING_DISK_CACHE_DIR,
+                size_limit=EMBEDDING_DISK_CACHE_SIZE,
+                eviction_policy="least-recently-used"
+            )
+        except Exception as e:
+            print(f"On-disk embedding cache disabled: {e}")
+            _disk_cache_failed = True
+    return _disk_cache
+
+# Maximum embedding requests in flight at once, across all callers
+EMBED_MAX_INFLIGHT = int(os.getenv("EMBED_MAX_INFLIGHT", "16"))
+
+# Errors worth retrying: rate limiting, timeouts and server-side failures
+_TRANSIENT_ERRORS = (
+    TimeoutError,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
+
+def _is_transient(error: BaseException) -> bool:
+    """True for transient API errors, including ones LangChain wraps in GoogleGenerativeAIError."""
+    while error is not None:
+        if isinstance(error, _TRANSIENT_ERRORS):
+            return True
+        error = error.__cause__
+    return False
+
+# Shared with document ingestion: vectors keyed by the blake2b content hash of the text
+_EMBEDDING_CACHE_COLLECTION = os.getenv("EMBEDDING_CACHE_COLLECTION", "embedding_cache")
+
+def content_hash(text: str) -> str:
+    """Cache key for a text; the same digest ingestion stores on each chunk."""
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def _get_model(api_key: str, model_name: str) -> GoogleGenerativeAIEmbeddings:
+    """One embeddings client per process, so every service instance shares its gRPC channel."""
+    return GoogleGenerativeAIEmbeddings(model=model_name, google_api_key=api_key)
 
 class EmbeddingService:
     def __init__(self):
@@ -12,31 +90,39 @@ class EmbeddingService:
         if not google_api_key:
             raise ValueError("GOOGLE_API_KEY environment variable not set.")
         
+        self.model_name = "models/embedding-001"
+        
+        # embed_query and embed_documents use different task types, so their vectors are cached apart
+        self.query_cache_namespace = embedding_cache_namespace(self.model_name, "retrieval_query")
+        self.document_cache_namespace = embedding_cache_namespace(self.model_name, "retrieval_document")
+        
         # Configure embedding model with timeout settings
         try:
-            self.embedding_model = GoogleGenerativeAIEmbeddings(
-                model="models/embedding-001",
-                google_api_key=google_api_key
-            )
+            self.embedding_model = _get_model(google_api_key, self.model_name)
         except Exception as e:
             print(f"Failed to initialize GoogleGenerativeAIEmbeddings: {e}")
             raise
         
-        # Configuration for retry and rate limiting
         self.max_text_length = 8000  # Limit text length to prevent timeouts
-        self.rate_limit_delay = 1.0  # Delay between requests
-        self.last_request_time = 0
+        
+        # Rate limiting: caps concurrent API calls so bursts queue here instead of drawing 429s,
+        # and any 429 that still comes back is retried with jittered backoff.
+        # One semaphore per event loop, since the service is shared by callers on different loops
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        
+        # In-process LRU in front of the MongoDB embedding cache, keyed by cache id
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
         
         print("EmbeddingService initialized with models/embedding-001 and timeout handling")
 
-    async def _rate_limit(self):
-        """Implement rate limiting to avoid hitting API limits."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.rate_limit_delay:
-            await asyncio.sleep(self.rate_limit_delay - time_since_last)
-        self.last_request_time = time.time()
-    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Return the in-flight call limit for the running loop."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(EMBED_MAX_INFLIGHT)
+        return semaphore
+
     def _truncate_text(self, text: str) -> str:
         """Truncate text to avoid timeouts with large chunks."""
         if len(text) > self.max_text_length:
@@ -45,31 +131,221 @@ class EmbeddingService:
         return text
     
     @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((Exception,))
+        stop=stop_after_attempt(5),
+        wait=wait_random_exponential(multiplier=0.5, max=16),
+        retry=retry_if_exception(_is_transient),
+        reraise=True
     )
     async def _get_embedding_with_retry(self, text: str) -> List[float]:
-        """Get embedding with retry logic for handling timeouts and errors."""
+        """Get embedding with jittered backoff on transient errors (429, 5xx, timeouts)."""
+        try:
+            # Native async client: in-flight requests wait on the event loop, not on worker threads
+            async with self._get_semaphore():
+                return await self.embedding_model.aembed_query(text)
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            raise
+    
+    @retry(
+        stop=stop_after_attempt(5),
+        wait=wait_random_exponential(multiplier=0.5, max=16),
+        retry=retry_if_exception(_is_transient),
+        reraise=True
+    )
+    async def _embed_documents_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """Batch form of _get_embedding_with_retry."""
         try:
-            # LangChain's embed_query is synchronous, so we run it in a thread pool
-            # to avoid blocking the event loop in an async context.
-            return await asyncio.to_thread(self.embedding_model.embed_query, text)
+            async with self._get_semaphore():
+                return await self.embedding_model.aembed_documents(texts)
         except Exception as e:
-            print(f"Error generating embedding (will retry): {e}")
+            print(f"Error generating batch embeddings: {e}")
             raise
     
+    def _cache_collection(self):
+        """The MongoDB embedding cache, or None when no database connection is set up."""
+        try:
+            return get_database()[_EMBEDDING_CACHE_COLLECTION]
+        except RuntimeError:
+            return None
+    
+    def _disk_get(self, cache_id: str) -> Optional[List[float]]:
+        cache = _get_disk_cache()
+        if cache is None:
+            return None
+        try:
+            data = cache.get(cache_id)
+        except Exception as e:
+            print(f"Error reading on-disk embedding cache: {e}")
+            return None
+        return None if data is None else np.frombuffer(data, dtype=np.float32).tolist()
+    
+    def _disk_set(self, cache_id: str, vector: List[float]):
+        cache = _get_disk_cache()
+        if cache is None:
+            return
+        try:
+            # Stored as packed float32 rather than a pickled list of Python floats
+            cache.set(cache_id, np.asarray(vector, dtype=np.float32).tobytes(), expire=EMBEDDING_DISK_CACHE_TTL)
+        except Exception as e:
+            print(f"Error writing on-disk embedding cache: {e}")
+    
+    def _remember(self, cache_id: str, vector: List[float]):
+        self._lru[cache_id] = vector
+        self._lru.move_to_end(cache_id)
+        if len(self._lru) > EMBEDDING_LRU_SIZE:
+            self._lru.popitem(last=False)
+    
+    async def _get_cached(self, cache_id: str) -> Optional[List[float]]:
+        """Looks a cache id up in the in-process LRU, then on disk, then in MongoDB."""
+        vector = self._lru.get(cache_id)
+        if vector is not None:
+            self._lru.move_to_end(cache_id)
+            return vector
+        
+        vector = self._disk_get(cache_id)
+        if vector is not None:
+            self._remember(cache_id, vector)
+            return vector
+        
+        collection = self._cache_collection()
+        if collection is None:
+            return None
+        try:
+            doc = await collection.find_one({"_id": cache_id}, {"vector": 1})
+        except Exception as e:
+            print(f"Error reading embedding cache: {e}")
+            return None
+        if doc is None:
+            return None
+        self._remember(cache_id, doc["vector"])
+        self._disk_set(cache_id, doc["vector"])
+        return doc["vector"]
+    
+    async def _store_cached(self, cache_id: str, namespace: str, vector: List[float]):
+        self._remember(cache_id, vector)
+        self._disk_set(cache_id, vector)
+        collection = self._cache_collection()
+        if collection is None:
+            return
+        try:
+            await collection.update_one(
+                {"_id": cache_id}, {"$set": {"model": namespace, "vector": vector}}, upsert=True
+            )
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+    
+    async def _get_cached_many(self, cache_ids: List[str]) -> Dict[str, List[float]]:
+        """Batch form of _get_cached: the LRU first, then disk, then one MongoDB query for the rest."""
+        found = {}
+        for cache_id in cache_ids:
+            vector = self._lru.get(cache_id)
+            if vector is not None:
+                self._lru.move_to_end(cache_id)
+                found[cache_id] = vector
+                continue
+            vector = self._disk_get(cache_id)
+            if vector is not None:
+                self._remember(cache_id, vector)
+                found[cache_id] = vector
+        
+        missing = [cache_id for cache_id in cache_ids if cache_id not in found]
+        collection = self._cache_collection()
+        if missing and collection is not None:
+            try:
+                async for doc in collection.find({"_id": {"$in": missing}}, {"vector": 1}):
+                    found[doc["_id"]] = doc["vector"]
+                    self._remember(doc["_id"], doc["vector"])
+                    self._disk_set(doc["_id"], doc["vector"])
+            except Exception as e:
+                print(f"Error reading embedding cache: {e}")
+        return found
+    
+    async def _store_cached_many(self, vectors: Dict[str, List[float]], namespace: str):
+        for cache_id, vector in vectors.items():
+            self._remember(cache_id, vector)
+            self._disk_set(cache_id, vector)
+        collection = self._cache_collection()
+        if not vectors or collection is None:
+            return
+        try:
+            await collection.insert_many(
+                [{"_id": cache_id, "model": namespace, "vector": vector} for cache_id, vector in vectors.items()],
+                ordered=False
+            )
+        except BulkWriteError:
+            # Duplicate keys mean the same content was cached concurrently
+            pass
+        except Exception as e:
+            print(f"Error writing embedding cache: {e}")
+    
+    async def get_embeddings(self, texts: List[str], batch_size: int = 100, max_concurrency: int = 8) -> List[List[float]]:
+        """List form of get_embeddings_matrix, in the same order as the input texts."""
+        return (await self.get_embeddings_matrix(texts, batch_size, max_concurrency)).tolist()
+    
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 100, max_concurrency: int = 8) -> np.ndarray:
+        """
+        Generates document embeddings for many texts as a float32 matrix, one row per text in input order.
+        Cached texts are skipped; the rest are sorted by length, split into batches of up to
+        batch_size (the API limit is 100) and embedded concurrently, max_concurrency at a time.
+        Every vector is written straight into its rows of the preallocated matrix.
+        """
+        namespace = self.document_cache_namespace
+        keys = [embedding_cache_id(namespace, content_hash(text)) for text in texts]
+        rows_by_key: Dict[str, List[int]] = {}
+        for row, key in enumerate(keys):
+            rows_by_key.setdefault(key, []).append(row)
+        
+        out = None
+        
+        def fill(key: str, vector):
+            nonlocal out
+            # Sized from the first vector, so the width always matches what the model returns
+            if out is None:
+                out = np.empty((len(keys), len(vector)), dtype=np.float32)
+            out[rows_by_key[key]] = vector
+        
+        cached = await self._get_cached_many(list(rows_by_key))
+        for key, vector in cached.items():
+            fill(key, vector)
+        
+        # One request slot per distinct uncached text, shortest first so batches are even
+        texts_by_key = {key: texts[rows[0]] for key, rows in rows_by_key.items() if key not in cached}
+        order = sorted(texts_by_key, key=lambda key: len(texts_by_key[key]))
+        batch_size = max(1, min(batch_size, 100))
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+        semaphore = asyncio.Semaphore(max_concurrency)
+        new_vectors = {}
+        
+        async def run_batch(batch: List[str]):
+            async with semaphore:
+                batch_texts = [self._truncate_text(texts_by_key[key]) for key in batch]
+                embeddings = await self._embed_documents_with_retry(batch_texts)
+            # Cached in the same reduced, unit-length form that is returned
+            matrix = reduce_embedding_matrix(np.asarray(embeddings, dtype=np.float32))
+            for key, vector in zip(batch, matrix):
+                fill(key, vector)
+                new_vectors[key] = vector.tolist()
+        
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        await self._store_cached_many(new_vectors, namespace)
+        
+        if out is None:
+            return np.empty((0, EMBEDDING_DIMS), dtype=np.float32)
+        return out
+    
     async def get_embedding(self, text: str) -> List[float]:
-        """Generates a vector embedding for the given text with error handling and retries."""
+        """Generates a query embedding for the given text, reusing cached vectors for identical text."""
+        key = embedding_cache_id(self.query_cache_namespace, content_hash(text))
+        cached = await self._get_cached(key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Apply rate limiting
-            await self._rate_limit()
-            
             # Truncate text if it's too long
             processed_text = self._truncate_text(text)
             
             # Get embedding with retry logic
-            return await self._get_embedding_with_retry(processed_text)
+            vector = await self._get_embedding_with_retry(processed_text)
             
         except Exception as e:
             error_msg = f"Error generating embedding after retries: {e}"
@@ -84,3 +360,7 @@ class EmbeddingService:
                 print("3. Try again later if Google API is experiencing issues")
             
             raise Exception(error_msg)
+        
+        vector = reduce_embeddings([vector])[0]
+        await self._store_cached(key, self.query_cache_namespace, vector)
+        return vector
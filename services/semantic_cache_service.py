@@ -0,0 +1,87 @@
+# services/semantic_cache_service.py
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from services.similarity_kernels import dot_scores
+
+class SemanticQueryCache:
+    """
+    In-process semantic cache for search results.
+
+    Entries are keyed by the L2-normalized query embedding. A lookup returns the cached
+    result of the most similar previous query (inner product over normalized vectors,
+    i.e. cosine similarity) when the similarity reaches the configured threshold.
+    Entries expire after a TTL and the least recently used entry is evicted when full.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 300.0, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # key -> (normalized vector, expiry time, scope, cached result)
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, float, Hashable, Dict[str, Any]]]" = OrderedDict()
+        self._next_key = 0
+
+        # Flat index over the live entries, rebuilt lazily after inserts/evictions
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _evict_expired(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry[1] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _get_matrix(self) -> Tuple[Optional[np.ndarray], List[int]]:
+        if self._matrix is None and self._entries:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    def get(self, embedding: List[float], scope: Hashable = None) -> Optional[Dict[str, Any]]:
+        """Return the cached result for the most similar query in the same scope, if any."""
+        self._evict_expired(time.monotonic())
+
+        matrix, keys = self._get_matrix()
+        if matrix is None:
+            return None
+
+        scores = dot_scores(self._normalize(embedding), matrix)
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.threshold:
+                break
+            key = keys[index]
+            entry = self._entries[key]
+            if entry[2] == scope:
+                self._entries.move_to_end(key)
+                return dict(entry[3])
+
+        return None
+
+    def put(self, embedding: List[float], result: Dict[str, Any], scope: Hashable = None):
+        """Store a result for the given query embedding, evicting the least recently used entry if full."""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        while len(self._entries) >= self.max_entries:
+            self._entries.popitem(last=False)
+
+        self._entries[self._next_key] = (self._normalize(embedding), now + self.ttl_seconds, scope, dict(result))
+        self._next_key += 1
+        self._matrix = None
+
+    def clear(self):
+        """Drop all cached entries."""
+        self._entries.clear()
+        self._matrix = None
@@ -0,0 +1,71 @@
+# services/similarity_kernels.py
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Optional: SIMD distance kernels, much faster than numpy for one query against many rows
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Optional: JIT-compiled fallback for platforms where simsimd is unavailable
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(fastmath=True, parallel=True, cache=True)
+    def _cosine_scores_jit(query, matrix):
+        query_norm = np.float32(0.0)
+        for col in range(query.shape[0]):
+            query_norm += query[col] * query[col]
+        query_norm = np.sqrt(query_norm)
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for row in prange(matrix.shape[0]):
+            dot = np.float32(0.0)
+            row_norm = np.float32(0.0)
+            for col in range(matrix.shape[1]):
+                dot += query[col] * matrix[row, col]
+                row_norm += matrix[row, col] * matrix[row, col]
+            denominator = np.sqrt(row_norm) * query_norm
+            scores[row] = dot / denominator if denominator > 0 else np.float32(0.0)
+        return scores
+
+def as_matrix(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stacks vectors into a C-contiguous float32 matrix, the layout the kernels expect."""
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+def cosine_scores(query: Sequence[float], matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity between the query and every row of the matrix."""
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    if simsimd is not None:
+        return 1.0 - np.asarray(simsimd.cdist(query.reshape(1, -1), matrix, metric="cosine")).ravel()
+    if njit is not None:
+        return _cosine_scores_jit(query, matrix)
+
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    return (matrix @ query) / norms
+
+def dot_scores(query: Sequence[float], matrix: np.ndarray) -> np.ndarray:
+    """Inner product between the query and every row; equals cosine for L2-normalized vectors."""
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    if simsimd is not None:
+        return np.asarray(simsimd.cdist(query.reshape(1, -1), matrix, metric="dot")).ravel()
+    return matrix @ query
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=scores.dtype)
+    # Partial selection first, so only k scores are fully sorted
+    candidates = np.argpartition(scores, -k)[-k:]
+    order = candidates[np.argsort(scores[candidates])[::-1]]
+    return order, scores[order]
+
+def cosine_topk(query: Sequence[float], matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The k rows most similar to the query by cosine similarity, as (indices, scores)."""
+    return top_k(cosine_scores(query, matrix), k)
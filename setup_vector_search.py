@@ -7,6 +7,9 @@ This script helps automate the vector search index creation for deployment.
 import asyncio
 import os
 import sys
+import time
+
+import numpy as np
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,8 +18,13 @@ load_dotenv()
 # Add current directory to path
 sys.path.append(os.path.dirname(__file__))
 
-from database.connection import connect_db, get_database
-from database.models.document_chunk_model import DocumentChunk
+# Same connection module as the app, so the search test below shares this script's client
+try:
+    from database.cloud_connection import connect_db_cloud_safe as connect_db, get_database
+except ImportError:
+    from database.connection import connect_db, get_database
+from database.models.document_chunk_model import DocumentChunk, EMBEDDING_DIMS, EMBEDDING_STORAGE_DTYPE, pack_embedding
+from config import get_settings
 
 async def setup_vector_search():
     """Set up Atlas Vector Search index for semantic search."""
@@ -24,14 +32,16 @@ async def setup_vector_search():
     print("🔧 Setting up Atlas Vector Search Index...")
     print("=" * 50)
     
+    settings = get_settings()
+    
     try:
-        # Connect to database
+        # Connect to database (returns at once when main() already connected)
         await connect_db([DocumentChunk])
         db = get_database()
-        collection = db[os.getenv("COLLECTION_NAME", "document_chunks")]
+        collection = db[settings.collection_name]
         
         # Check if this is an Atlas connection
-        mongo_uri = os.getenv("MONGODB_CONNECTION_STRING")
+        mongo_uri = settings.mongo_uri
         if not mongo_uri or "mongodb+srv://" not in mongo_uri:
             print("⚠️  WARNING: Vector search requires MongoDB Atlas.")
             print("   Local MongoDB does not support vector search.")
@@ -41,15 +51,17 @@ async def setup_vector_search():
         print("✅ Connected to Atlas database")
         
         # Vector search index configuration
-        vector_index_name = os.getenv("VECTOR_INDEX_NAME", "vector_index")
+        vector_index_name = settings.vector_index_name
         
-        # Check if index already exists
+        # Check if index already exists; search indexes are not returned by list_indexes,
+        # and filtering by name server-side fetches only this index's definition
         try:
-            indexes = await collection.list_indexes().to_list(None)
-            existing_indexes = [idx.get('name', '') for idx in indexes]
+            existing_indexes = await collection.list_search_indexes(vector_index_name).to_list(1)
             
-            if vector_index_name in existing_indexes:
+            if existing_indexes:
                 print(f"✅ Vector search index '{vector_index_name}' already exists!")
+                if existing_indexes[0].get("queryable"):
+                    await warm_vector_index(collection, vector_index_name)
                 return True
                 
         except Exception as e:
@@ -61,29 +73,40 @@ async def setup_vector_search():
         print(f"   Database: {db.name}")
         
         # Atlas Vector Search index definition
+        embedding_field = {
+            "path": "embedding",
+            "numDimensions": EMBEDDING_DIMS,  # 768 for embedding-001 unless truncated
+            # Indexes both float32 and int8 (EMBEDDING_STORAGE_DTYPE=int8) BSON vectors
+            "similarity": "cosine",
+            "type": "vector"
+        }
+        if EMBEDDING_STORAGE_DTYPE == "float32":
+            # Let Atlas keep int8 copies of the float32 vectors in the index (about 4x less
+            # mongot RAM); pre-quantized int8 vectors are indexed as stored
+            embedding_field["quantization"] = "scalar"
+            # Stored float32 vectors are unit length, so a plain dot product ranks like cosine;
+            # int8 vectors drop their per-vector scale and stay on cosine
+            embedding_field["similarity"] = "dotProduct"
+        
         vector_search_config = {
             "fields": [
-                {
-                    "path": "embedding",
-                    "numDimensions": 768,  # Google's embedding-001 model dimension
-                    "similarity": "cosine",
-                    "type": "vector"
-                },
+                embedding_field,
                 {
                     "path": "text_content",
                     "type": "string"
                 },
+                # Filter fields pre-narrow the $vectorSearch graph traversal
                 {
                     "path": "document_name",
-                    "type": "string"
+                    "type": "filter"
                 },
                 {
                     "path": "document_id",
-                    "type": "string"
+                    "type": "filter"
                 },
                 {
                     "path": "document_type",
-                    "type": "string"
+                    "type": "filter"
                 }
             ]
         }
@@ -126,7 +149,51 @@ async def setup_vector_search():
         
         return False
 
-async def test_vector_search():
+async def warm_vector_index(collection, index_name: str, queries: int = 50, concurrency: int = 4):
+    """
+    Sends random-vector searches so the index's HNSW graph is read into the search node's
+    memory now, rather than during the first user queries.
+    """
+    print(f"🔥 Warming vector index with {queries} queries...")
+    rng = np.random.default_rng()
+    vectors = rng.standard_normal((queries, EMBEDDING_DIMS)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def search(vector: np.ndarray) -> float:
+        pipeline = [
+            {"$vectorSearch": {
+                "queryVector": pack_embedding(vector),
+                "path": "embedding",
+                "numCandidates": 200,
+                "limit": 10,
+                "index": index_name,
+            }},
+            {"$project": {"_id": 1}},
+        ]
+        async with semaphore:
+            start = time.perf_counter()
+            await collection.aggregate(pipeline).to_list(None)
+            return time.perf_counter() - start
+    
+    try:
+        latencies = await asyncio.gather(*(search(vector) for vector in vectors))
+        print(f"✅ Vector index warmed (average query latency {sum(latencies) / len(latencies) * 1000:.0f} ms)")
+    except Exception as e:
+        print(f"⚠️  Vector index warmup failed: {e}")
+
+async def warmup_embedding_api(embedding_service) -> bool:
+    """Embeds one word, validating the Google API key and opening the API connection early."""
+    start = time.perf_counter()
+    try:
+        await embedding_service.get_embedding("warmup")
+        print(f"✅ Google AI API reachable ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return True
+    except Exception as e:
+        print(f"⚠️  Google AI API warmup failed: {e}")
+        return False
+
+async def test_vector_search(embedding_service=None):
     """Test if vector search is working properly."""
     
     print("\n🧪 Testing Vector Search Setup...")
@@ -135,8 +202,8 @@ async def test_vector_search():
         from services.document_mongodb_service import DocumentMongoDBService
         from services.alternative_embedding_service import AlternativeEmbeddingService
         
-        # Initialize services
-        embedding_service = AlternativeEmbeddingService()
+        # Initialize services, reusing the already warmed-up embedding client when given
+        embedding_service = embedding_service or AlternativeEmbeddingService()
         mongodb_service = DocumentMongoDBService(embedding_service)
         
         # Test search (this will use fallback if vector search isn't ready)
@@ -163,18 +230,29 @@ if __name__ == "__main__":
     print("=" * 50)
     
     # Check prerequisites
-    if not os.getenv("MONGODB_CONNECTION_STRING"):
+    if not get_settings().mongo_uri:
         print("❌ MONGODB_CONNECTION_STRING not found in environment variables")
         print("Please set up your .env file with Atlas connection string")
         sys.exit(1)
     
-    if not os.getenv("GOOGLE_API_KEY"):
+    if not get_settings().google_api_key:
         print("❌ GOOGLE_API_KEY not found in environment variables")
         print("Please set up your .env file with Google AI API key")
         sys.exit(1)
     
     # Run setup
     async def main():
+        from services.alternative_embedding_service import AlternativeEmbeddingService
+        embedding_service = AlternativeEmbeddingService()
+        
+        # Connecting to MongoDB and warming up the embedding API are independent, so overlap them;
+        # a failed connection is retried and reported with troubleshooting hints by setup_vector_search
+        await asyncio.gather(
+            connect_db([DocumentChunk]),
+            warmup_embedding_api(embedding_service),
+            return_exceptions=True
+        )
+        
         success = await setup_vector_search()
         
         if success:
@@ -182,7 +260,7 @@ if __name__ == "__main__":
             print("Follow the manual steps above to complete the setup.")
             
             # Test current setup
-            await test_vector_search()
+            await test_vector_search(embedding_service)
         else:
             print("\n❌ Vector Search setup failed.")
             print("Please check the error messages and try again.")
@@ -13,6 +13,8 @@ from pathlib import Path
 # Add project root to path
 sys.path.append(str(Path(__file__).parent))
 
+from config import get_settings
+
 def setup_render_environment():
     """Set up Render-specific environment variables and configurations."""
     
@@ -20,7 +22,7 @@ def setup_render_environment():
     print("=" * 50)
     
     # Detect Render environment
-    is_render = bool(os.getenv("RENDER") or os.getenv("RENDER_SERVICE_NAME"))
+    is_render = get_settings().is_render
     
     if is_render:
         print("✅ Detected Render deployment environment")
@@ -88,15 +90,24 @@ async def test_database_connection():
         print(f"❌ Database connection failed: {str(e)}")
         return False
 
+# Text embedded by the startup warmup, and its vector once the round-trip succeeded
+_WARMUP_TEXT = "warmup"
+_warmup_embedding = None
+
 def test_google_ai_api():
-    """Test Google AI API connection."""
+    """Test Google AI API connection with a real (tiny) embedding round-trip."""
+    global _warmup_embedding
     
     print("\n🔍 Testing Google AI API...")
     
+    if _warmup_embedding is not None:
+        print("✅ Google AI API already warmed up")
+        return True
+    
     try:
         import google.generativeai as genai
         
-        api_key = os.getenv("GOOGLE_API_KEY")
+        api_key = get_settings().google_api_key
         if not api_key:
             print("❌ Google AI API key not found")
             return False
@@ -104,8 +115,16 @@ def test_google_ai_api():
         # Configure the API
         genai.configure(api_key=api_key)
         
-        # Test with a simple embedding request (this validates the key without making a big request)
-        print("✅ Google AI API key configured successfully")
+        # A one-word embedding validates the key and the network path, and pays the
+        # connection setup before the first user query does
+        start = time.perf_counter()
+        result = genai.embed_content(
+            model="models/embedding-001",
+            content=_WARMUP_TEXT,
+            request_options={"timeout": 5.0}
+        )
+        _warmup_embedding = result['embedding']
+        print(f"✅ Google AI API embedding round-trip OK ({(time.perf_counter() - start) * 1000:.0f} ms)")
         return True
         
     except Exception as e:
@@ -135,40 +154,35 @@ async def health_check_sequence():
     
     all_passed = True
     
-    # Test database connection
-    try:
-        db_result = await test_database_connection()
-        if db_result:
-            print("✅ Database Connection: PASS")
-        else:
-            print("❌ Database Connection: FAIL")
+    # The checks are independent, so run them concurrently (the Google AI check is
+    # blocking and runs in a worker thread)
+    db_result, ai_result = await asyncio.gather(
+        test_database_connection(),
+        asyncio.to_thread(test_google_ai_api),
+        return_exceptions=True
+    )
+    
+    for name, result in (("Database Connection", db_result), ("Google AI API", ai_result)):
+        if isinstance(result, BaseException):
+            print(f"❌ {name}: ERROR - {str(result)}")
             all_passed = False
-    except Exception as e:
-        print(f"❌ Database Connection: ERROR - {str(e)}")
-        all_passed = False
-    
-    # Test Google AI API
-    try:
-        ai_result = test_google_ai_api()
-        if ai_result:
-            print("✅ Google AI API: PASS")
+        elif result:
+            print(f"✅ {name}: PASS")
         else:
-            print("❌ Google AI API: FAIL")
+            print(f"❌ {name}: FAIL")
             all_passed = False
-    except Exception as e:
-        print(f"❌ Google AI API: ERROR - {str(e)}")
-        all_passed = False
     
     return all_passed
 
-async def main():
+def main():
     """Main startup sequence."""
     
     # Setup environment
     setup_render_environment()
     
-    # Run health checks
-    health_ok = await health_check_sequence()
+    # Run health checks; the event loop is closed again before Streamlit starts,
+    # since Streamlit's server needs to own the main thread's loop
+    health_ok = asyncio.run(health_check_sequence())
     
     if not health_ok:
         print("\n❌ Health checks failed!")
@@ -177,7 +191,7 @@ async def main():
         
         # In Render, we still want to start the app even if some checks fail
         # This prevents the deployment from being marked as failed
-        if os.getenv("RENDER") or os.getenv("RENDER_SERVICE_NAME"):
+        if get_settings().is_render:
             print("⚠️  Starting application anyway (Render deployment)")
         else:
             print("Exiting due to health check failures...")
@@ -191,4 +205,4 @@ async def main():
     start_main_application()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -4,17 +4,29 @@ Test MongoDB Atlas connection - Use this to verify your connection string works
 """
 
 import os
+import re
 import asyncio
 import sys
 from dotenv import load_dotenv
+from config import get_settings
 
 # Load environment variables
 load_dotenv()
 
+# user:password@ right after the scheme; only the password is masked
+_AUTH_RE = re.compile(r"(?<=://)([^:/@]+):([^@]+)@")
+
+# Secret variables, printed as (leading, trailing) visible characters around ***
+_MASK_RULES = {
+    "MONGODB_CONNECTION_STRING": (20, 10),
+    "GOOGLE_API_KEY": (8, 4),
+}
+
 async def test_mongodb_connection():
     """Test MongoDB Atlas connection with detailed error reporting"""
     
-    connection_string = os.getenv("MONGODB_CONNECTION_STRING")
+    settings = get_settings()
+    connection_string = settings.mongo_uri
     
     if not connection_string:
         print("❌ Error: MONGODB_CONNECTION_STRING not found in environment variables")
@@ -22,53 +34,34 @@ async def test_mongodb_connection():
         return False
     
     # Mask password in connection string for logging
-    masked_string = connection_string
-    if "@" in masked_string and "://" in masked_string:
-        parts = masked_string.split("://")
-        if len(parts) > 1 and "@" in parts[1]:
-            auth_part = parts[1].split("@")[0]
-            if ":" in auth_part:
-                username, password = auth_part.split(":", 1)
-                masked_string = connection_string.replace(password, "***")
+    masked_string = _AUTH_RE.sub(r"\1:***@", connection_string)
     
     print(f"🔗 Testing connection to: {masked_string}")
     
     try:
-        # Test with pymongo first (simpler)
-        print("\n📦 Testing with pymongo...")
+        # Test with the process-wide Motor client, which the Beanie test below reuses
+        print("\n📦 Testing with the shared Motor client...")
         
-        from pymongo import MongoClient
-        from pymongo.server_api import ServerApi
+        from database.client_singleton import get_motor_client
+        client = get_motor_client()
         
-        # Create client with explicit timeout settings
-        client = MongoClient(
-            connection_string,
-            server_api=ServerApi('1'),
-            serverSelectionTimeoutMS=10000,  # 10 seconds
-            connectTimeoutMS=10000,  # 10 seconds
-            socketTimeoutMS=10000,   # 10 seconds
-            maxPoolSize=10,
-            retryWrites=True
-        )
-        
-        # Test the connection
+        # Test the connection; hello also reports the server's capabilities in the same round-trip
         print("🔍 Testing server connection...")
-        client.admin.command('ping')
-        print("✅ Ping successful!")
+        info = await client.admin.command('hello')
+        print(f"✅ Server reachable! (wire version {info.get('maxWireVersion', 'unknown')}, "
+              f"primary: {info.get('isWritablePrimary', 'unknown')})")
         
         # Test database access
-        db_name = os.getenv("DATABASE_NAME", "document_analysis")
-        collection_name = os.getenv("COLLECTION_NAME", "document_chunks")
+        db_name = settings.database_name
+        collection_name = settings.collection_name
         
         print(f"🗄️  Testing database access: {db_name}.{collection_name}")
-        db = client[db_name]
-        collection = db[collection_name]
+        collection = client[db_name][collection_name]
         
-        # Try to get collection stats (this tests read permissions)
-        stats = db.command("collstats", collection_name)
-        print(f"✅ Collection access successful! Documents: {stats.get('count', 'unknown')}")
+        # Count from collection metadata (this tests read permissions without scanning)
+        count = await collection.estimated_document_count()
+        print(f"✅ Collection access successful! Documents: {count}")
         
-        client.close()
         print("✅ MongoDB connection test PASSED!")
         return True
         
@@ -153,14 +146,10 @@ def check_environment_variables():
     for var in required_vars:
         value = os.getenv(var)
         if value:
-            if var == "MONGODB_CONNECTION_STRING":
-                masked = value[:20] + "***" + value[-10:] if len(value) > 30 else "***"
-                print(f"✅ {var}: {masked}")
-            elif var == "GOOGLE_API_KEY":
-                masked = value[:8] + "***" + value[-4:] if len(value) > 12 else "***"
-                print(f"✅ {var}: {masked}")
-            else:
-                print(f"✅ {var}: {value}")
+            if var in _MASK_RULES:
+                prefix, suffix = _MASK_RULES[var]
+                value = f"{value[:prefix]}***{value[-suffix:]}" if len(value) > prefix + suffix else "***"
+            print(f"✅ {var}: {value}")
         else:
             print(f"❌ {var}: NOT SET")
             missing_vars.append(var)